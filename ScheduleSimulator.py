@@ -3,6 +3,13 @@ from scheduler_gurobi import SchedulerGurobi
 from scheduler_cpsat import SchedulerCPSAT
 from scheduler_highs import SchedulerHighs
 from scheduler_pulp import SchedulerPulp
+from scheduler_colgen import SchedulerColumnGeneration
+from scheduler_greedy import SchedulerGreedy
+from scheduler_lns import SchedulerLNS
+from scheduler_lagrangian import SchedulerLagrangian
+from scheduler_portfolio import SchedulerPortfolio
+from scheduler_scipy import SchedulerScipy
+from scheduler_scip import SchedulerSCIP
 import json
 import os
 from scheduler_utils import TelescopeEvent, RequestInjection, cut_time_segments, trim_time_segments
@@ -12,7 +19,8 @@ from scheduler_utils import TelescopeEvent, RequestInjection, cut_time_segments,
 
 class SchedulerSimulation(object):
     def __init__(self, filepath=None, data=None, timelimit=0,
-                 scheduler_type=None, simulation_horizon_days=7):
+                 scheduler_type=None, simulation_horizon_days=7, persistent=False,
+                 greedy_fallback=False, scheduler_options=None, cache=None):
         if filepath != None:
             self.load_file(filepath)
         elif data != None:
@@ -24,6 +32,15 @@ class SchedulerSimulation(object):
         self.timelimit=timelimit
         self.scheduler_type = scheduler_type
         self.Scheduler = self.get_scheduler(scheduler_type)
+        # Keep one scheduler across runs, updating its model for each event
+        self.persistent = persistent
+        self.last_sched = None
+        # Fall back to greedy dispatch whenever the solver returns no schedule
+        self.greedy_fallback = greedy_fallback
+        # Extra keyword arguments for the scheduler, e.g. CP-SAT's num_workers
+        self.scheduler_options = scheduler_options or {}
+        # A SolveCache shared by every scheduler run, e.g. across repeated simulations
+        self.cache = cache
         self.simulation_horizon = simulation_horizon_days * 24 * 60 * 60
 
         self.current_event = 0
@@ -33,11 +50,21 @@ class SchedulerSimulation(object):
         scheduler_types = {
             "gurobi": SchedulerGurobi,
             "cpsat": SchedulerCPSAT,
+            "cpsat_interval": SchedulerCPSAT,
             "highs": SchedulerHighs,
             "cbc": SchedulerPulp,
             "scip": SchedulerPulp,
+            "highs_pulp": SchedulerPulp,
             "gurobi_pulp": SchedulerPulp,
-            "gurobi_pulp_cmd": SchedulerPulp
+            "gurobi_pulp_cmd": SchedulerPulp,
+            "colgen": SchedulerColumnGeneration,
+            "greedy": SchedulerGreedy,
+            "lns_cpsat": SchedulerLNS,
+            "lns_highs": SchedulerLNS,
+            "lagrangian": SchedulerLagrangian,
+            "portfolio": SchedulerPortfolio,
+            "scipy": SchedulerScipy,
+            "scip_native": SchedulerSCIP
         }
         return scheduler_types[scheduler_type]
 
@@ -231,12 +258,22 @@ class SchedulerSimulation(object):
 
 
     def run_scheduler(self, requests, resources):
-        # Complete a scheduling run with the current information
-        scheduler = self.Scheduler(self.now, self.horizon, self.slice_size,
-                                   resources, self.proposals, requests,
-                                   verbose=0, timelimit=self.timelimit,
-                                   scheduler_type=self.scheduler_type)
-        currently_scheduled = scheduler.run()
+        # Complete a scheduling run with the current information, starting from the last schedule
+        warm_start = self.scheduler_results[-1] if len(self.scheduler_results) > 0 else None
+        if self.persistent and self.last_sched is not None and self.last_sched.supports_incremental:
+            scheduler = self.last_sched
+            currently_scheduled = scheduler.rerun(self.now, resources, requests, warm_start=warm_start)
+        else:
+            scheduler = self.Scheduler(self.now, self.horizon, self.slice_size,
+                                       resources, self.proposals, requests,
+                                       verbose=0, timelimit=self.timelimit,
+                                       scheduler_type=self.scheduler_type,
+                                       persistent=self.persistent,
+                                       warm_start=warm_start,
+                                       greedy_fallback=self.greedy_fallback,
+                                       cache=self.cache,
+                                       **self.scheduler_options)
+            currently_scheduled = scheduler.run()
         self.last_sched = scheduler
         self.scheduler_results.append(currently_scheduled)
 
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+
+# Request fields added by the scheduler itself, which would otherwise make
+# identical instances hash differently depending on what has run before
+DERIVED_REQUEST_FIELDS = ("free_windows_dict", "effective_priority")
+
+
+def canonical(value):
+    # json.dumps fallback for the numpy values and sets found in scheduler inputs
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError("Cannot hash a value of type {}".format(type(value).__name__))
+
+
+class SolveCache(object):
+    # Results of scheduler runs on disk, one JSON file per instance, keyed by a hash
+    # of everything the result depends on. When the files grow past max_bytes, the
+    # least recently used are deleted.
+    def __init__(self, directory=".scheduler_cache", max_bytes=256*1024*1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+
+    def key(self, now, horizon, slice_size, resources, proposals, requests, scheduler_type, params):
+        requests = {str(i): {k: v for k, v in r.items() if k not in DERIVED_REQUEST_FIELDS}
+                    for i, r in requests.items()}
+        instance = {"now": now, "horizon": horizon, "slice_size": slice_size,
+                    "resources": resources, "proposals": proposals, "requests": requests,
+                    "scheduler_type": scheduler_type, "params": params}
+        text = json.dumps(instance, sort_keys=True, separators=(",", ":"), default=canonical)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "r") as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        # Mark as recently used. Another process may have evicted it since it was read.
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        self.hits += 1
+        return result
+
+
+    def put(self, key, result):
+        # Write to a temporary file first, so a reader never sees a partial result
+        path = self.path(key)
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp_path, "w") as f:
+            json.dump(result, f, default=canonical)
+        os.replace(temp_path, path)
+        self.evict()
+
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.directory, name))
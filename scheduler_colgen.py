@@ -0,0 +1,194 @@
+from scheduler_v2 import SchedulerV2
+from scheduler_utils import RequestIndex, SliceConflictIndex, PackingModel
+from scipy.optimize import linprog, milp, Bounds, LinearConstraint
+import numpy as np
+import time
+
+class SchedulerColumnGeneration(SchedulerV2):
+    # Slice rows are only ever built for the columns in the restricted master problem
+    uses_slice_index = False
+
+    def __init__(self, now, horizon, slice_size,
+                 resources, proposals, requests, verbose=1,
+                 timelimit=0, scheduler_type=None, **kwargs):
+
+        super().__init__(now, horizon, slice_size, resources, proposals,
+            requests, verbose, timelimit, scheduler_type, **kwargs)
+
+        self.max_iterations = 100
+        self.reduced_cost_tolerance = 1e-6
+        self.optimality_tolerance = 1e-6  # Relative gap to the LP bound accepted as optimal
+        self.columns = None
+        self.lp_bound = None
+        self.colgen_stats = {}
+
+
+    def check_scheduler_type(self):
+        if self.scheduler_type != "colgen":
+            print("ERROR: Mismatched scheduler_type. '{}' should be 'colgen'.".format(self.scheduler_type))
+
+
+    def solver_params(self):
+        return {"max_iterations": self.max_iterations,
+                "reduced_cost_tolerance": self.reduced_cost_tolerance,
+                "optimality_tolerance": self.optimality_tolerance}
+
+
+    def build_model(self):
+        # Start from the earliest possible start of every free window
+        yik = self.yik
+        order = np.lexsort((yik.first_slice, yik.resource_idx, yik.request_idx))
+        request = yik.request_idx[order]
+        resource = yik.resource_idx[order]
+        first = yik.first_slice[order]
+
+        window_first = np.ones(len(order), dtype=bool)
+        window_first[1:] = ((request[1:] != request[:-1])
+                            | (resource[1:] != resource[:-1])
+                            | (first[1:] != first[:-1] + 1))
+        internal = yik.internal_start[order] != first * self.slice_size
+
+        self.columns = np.sort(order[window_first | internal])
+        self.log("Column generation starting from {} of {} possible starts".format(
+            len(self.columns), len(yik)), 1)
+
+
+    def apply_warm_start(self, rows):
+        # Seed the restricted master with the starts of the previous schedule
+        self.columns = np.union1d(self.columns, rows)
+
+
+    def master_model(self, columns):
+        # Request rows, then slice rows, over the given columns only
+        restricted = self.yik.take(columns)
+        request_index = RequestIndex.from_table(restricted)
+        request_index = request_index.take_rows(np.diff(request_index.indptr) > 0)
+        slice_index = SliceConflictIndex.from_table(restricted)
+        return PackingModel.from_indices(restricted, request_index, slice_index)
+
+
+    def solve_master_lp(self, columns):
+        pm = self.master_model(columns)
+        request_index = pm.request_index
+        slice_index = pm.slice_index
+        result = linprog(-pm.objective, A_ub=pm.A, b_ub=pm.row_upper,
+                         bounds=list(zip(pm.col_lower, pm.col_upper)), method="highs")
+        if result.status != 0:
+            # No duals to price with
+            self.log("Master LP failed: {}".format(result.message), 1)
+            return None
+
+        # Duals of the maximisation problem are the negated marginals
+        duals = -result.ineqlin.marginals
+        n_request_rows = len(request_index)
+        request_duals = np.zeros(len(self.yik.request_ids))
+        request_duals[request_index.request_idx] = duals[:n_request_rows]
+
+        n_slices = int((self.yik.first_slice + self.yik.n_slices).max(initial=0)) + 1
+        slice_duals = np.zeros((len(self.yik.resources), n_slices))
+        slice_duals[slice_index.resource_idx, slice_index.slice_idx] = duals[n_request_rows:]
+
+        return -result.fun, request_duals, slice_duals
+
+
+    def price_columns(self, request_duals, slice_duals):
+        # Reduced cost of every possible start, summing slice duals with prefix sums
+        yik = self.yik
+        prefix = np.zeros((slice_duals.shape[0], slice_duals.shape[1] + 1))
+        np.cumsum(slice_duals, axis=1, out=prefix[:, 1:])
+        slice_cost = (prefix[yik.resource_idx, yik.first_slice + yik.n_slices]
+                      - prefix[yik.resource_idx, yik.first_slice])
+        return yik.objective() - request_duals[yik.request_idx] - slice_cost
+
+
+    def solve_model(self):
+        # The time limit covers pricing and the final integer solve. Pricing stops once
+        # half of it is used, leaving the rest for the integer solve.
+        start = time.time()
+        if len(self.yik) == 0:
+            # No possible starts, so the empty schedule is optimal
+            self.result = None
+            self.scheduler_status = 1
+            self.bound = 0.0
+            self.log("Model empty", 1)
+            return
+
+        columns = self.columns
+        in_master = np.zeros(len(self.yik), dtype=bool)
+        in_master[columns] = True
+
+        iteration = 0
+        converged = False
+        lp_value = None
+        for iteration in range(1, self.max_iterations + 1):
+            master = self.solve_master_lp(columns)
+            if master is None:
+                break
+            lp_value, request_duals, slice_duals = master
+            reduced_cost = self.price_columns(request_duals, slice_duals)
+            reduced_cost[in_master] = -np.inf
+
+            # Add the most attractive new start of each request
+            order = np.lexsort((-reduced_cost, self.yik.request_idx))
+            best = order[np.flatnonzero(np.diff(self.yik.request_idx[order], prepend=-1))]
+            new_columns = best[reduced_cost[best] > self.reduced_cost_tolerance]
+            if len(new_columns) == 0:
+                converged = True
+                break
+            in_master[new_columns] = True
+            columns = np.flatnonzero(in_master)
+            if self.timelimit > 0 and time.time() - start > self.timelimit / 2:
+                self.log("Column generation stopped at the time limit", 1)
+                break
+
+        self.columns = columns
+        self.lp_bound = lp_value
+        self.colgen_stats = {"iterations": iteration, "columns": len(columns),
+                             "possible_starts": len(self.yik), "lp_bound": lp_value,
+                             "converged": converged}
+        self.log("Column generation: {} columns after {} iterations, LP bound {}".format(
+            len(columns), iteration, lp_value), 1)
+
+        # Price-and-branch: solve the integer problem over the generated columns
+        pm = self.master_model(columns)
+        options = {"disp": self.verbose_level >= 2}
+        if self.timelimit > 0:
+            options["time_limit"] = max(self.timelimit - (time.time() - start), 0.01)
+        self.result = milp(-pm.objective, integrality=np.ones(pm.num_col), bounds=Bounds(pm.col_lower, pm.col_upper),
+                           constraints=LinearConstraint(pm.A, pm.row_lower, pm.row_upper), options=options)
+
+        if self.result.x is None:
+            print("Model Status not optimal:", self.result.message)
+            return
+
+        # The integer solve is only optimal over the generated columns. The schedule is
+        # proven optimal once no column prices out and it meets the master LP bound.
+        objective = -self.result.fun
+        if (converged and self.result.status == 0
+                and objective >= lp_value - self.optimality_tolerance * max(1.0, abs(lp_value))):
+            self.scheduler_status = 1
+            self.log("Model optimized", 1)
+        else:
+            self.scheduler_status = 2
+            self.log("Model stopped with an incumbent: {}".format(self.result.message), 1)
+
+        # Once no column prices out, the master LP bounds the full problem
+        if converged:
+            self.bound = lp_value
+
+
+    def interpret_model(self):
+        if self.result is None:
+            self.objective_value = 0.0
+            self.schedule_yik_index = np.zeros(0, dtype=np.int64)
+            return
+        self.objective_value = -self.result.fun
+        self.schedule_yik_index = self.columns[np.flatnonzero(self.result.x > 0.5)]
+
+
+    def write_model(self, filename="test_model.mps"):
+        print("Write_Model Failed: column generation does not build a full model.")
+
+
+    def load_model(self, filename="test_model.mps"):
+        print("Load_Model Failed: column generation does not build a full model.")
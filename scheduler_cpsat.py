@@ -1,81 +1,333 @@
 from scheduler_v2 import SchedulerV2
 from ortools.sat.python import cp_model
-from gurobipy import tuplelist
+import numpy as np
 
 class SchedulerCPSAT(SchedulerV2):
     def __init__(self, now, horizon, slice_size, 
                  resources, proposals, requests, verbose=1,
-                 timelimit=0, scheduler_type=None):
+                 timelimit=0, scheduler_type=None, num_workers=0, random_seed=None,
+                 deterministic=False, subsolvers=None, lns_only=False,
+                 objective_scale=1000, cpsat_parameters=None, **kwargs):
 
         super().__init__(now, horizon, slice_size, resources, proposals,
-            requests, verbose, timelimit, scheduler_type)
+            requests, verbose, timelimit, scheduler_type, **kwargs)
+
+        self.num_workers = num_workers           # Search workers, 0 to use every core
+        self.random_seed = random_seed
+        self.deterministic = deterministic       # Reproducible multi-worker runs, for benchmarks
+        self.subsolvers = subsolvers             # Names of the subsolvers in the search portfolio
+        self.lns_only = lns_only                 # Only run the LNS workers, after a first solution
+        self.objective_scale = objective_scale   # CP-SAT needs integer objective coefficients
+        self.cpsat_parameters = cpsat_parameters # Any other CP-SAT parameters, by name
+
+
+    @property
+    def supports_incremental(self):
+        # Only the time-indexed model keeps one row per request and per slice to update
+        return self.scheduler_type == "cpsat"
 
 
     def check_scheduler_type(self):
-        if self.scheduler_type != "cpsat":
-            print("ERROR: Mismatched scheduler_type. '{}' should be 'cpsat'.".format(self.scheduler_type))
+        if self.scheduler_type not in ("cpsat", "cpsat_interval"):
+            print("ERROR: Mismatched scheduler_type. '{}' should be 'cpsat' or 'cpsat_interval'.".format(self.scheduler_type))
+
+
+    def solver_params(self):
+        return {"num_workers": self.num_workers, "random_seed": self.random_seed,
+                "deterministic": self.deterministic, "subsolvers": self.subsolvers,
+                "lns_only": self.lns_only, "objective_scale": self.objective_scale,
+                "cpsat_parameters": self.cpsat_parameters}
+
+
+    def component_args(self, request_ids):
+        args = super().component_args(request_ids)
+        args.update(self.solver_params())
+        return args
+
+
+    def scaled_objective(self, coefs):
+        # Objective coefficients rounded to integers after scaling, so that CP-SAT
+        # does not have to approximate a floating-point objective itself
+        return np.rint(np.asarray(coefs) * self.objective_scale).astype(np.int64).tolist()
 
 
     def build_model(self):
+        if self.scheduler_type == "cpsat_interval":
+            self.build_interval_model()
+        else:
+            self.build_time_indexed_model()
+
+
+    def build_time_indexed_model(self):
+        pm = self.packing_model()
+
+        model = cp_model.CpModel()
+
+        # Construct the isScheduled binary variables for every possible start for every request, in the Yik
+        scheduled_vars = [model.NewBoolVar(str(yik_id)) for yik_id in range(pm.num_col)]
+
+        # CP-SAT has no matrix interface, so every row is written straight into the proto.
+        # Constraint 4: Each request only scheduled once, then
+        # Constraint 3: Each timeslice should only have one request in it
+        proto = model.Proto()
+        lower = np.where(np.isfinite(pm.row_lower), pm.row_lower, cp_model.INT_MIN).astype(np.int64).tolist()
+        upper = np.where(np.isfinite(pm.row_upper), pm.row_upper, cp_model.INT_MAX).astype(np.int64).tolist()
+        coeffs = pm.A.data.astype(np.int64).tolist()
+        indptr = pm.A.indptr.tolist()
+        var_index = [var.Index() for var in scheduled_vars]
+        rows = []
+        for k, cols in enumerate(pm.rows()):
+            linear = proto.constraints.add().linear
+            linear.vars.extend([var_index[i] for i in cols])
+            linear.coeffs.extend(coeffs[indptr[k]:indptr[k+1]])
+            linear.domain.extend([lower[k], upper[k]])
+            rows.append(len(proto.constraints) - 1)
+
+        model.Maximize(cp_model.LinearExpr.WeightedSum(scheduled_vars, self.scaled_objective(pm.objective)))
+
+        # Rows are kept as their index in the proto
+        self.scheduled_vars = scheduled_vars
+        self.request_rows = rows[:pm.n_request_rows]
+        self.slice_rows = rows[pm.n_request_rows:]
+        self.model = model
+        self.log("Model constructed", 1)
+
+
+    def build_interval_model(self):
+        # One optional interval per request per resource, measured in slices, so that two
+        # starts overlap exactly when they would share a slice in the time-indexed model.
+        # Intervals are fixed-size: the first start of a window can occupy one more slice
+        # than the rest, so those get an interval of their own. The model grows with the
+        # number of intervals, not with the number of possible starts.
+        # Each interval earns its latest start's objective when present, and the
+        # earlier-start tie-break on top of it through an element constraint on its start.
         yik = self.yik
-        aikt = self.aikt
+        coefs = np.asarray(self.scaled_objective(yik.objective()))
 
         model = cp_model.CpModel()
 
-        requestLocations = tuplelist()
-        scheduled_vars = []
+        order = np.lexsort((yik.first_slice, yik.n_slices, yik.resource_idx, yik.request_idx))
+        group_key = np.stack([yik.request_idx, yik.resource_idx, yik.n_slices])[:, order]
+        new_group = np.any(np.diff(group_key, axis=1, prepend=-1) != 0, axis=0)
+        group_bounds = np.flatnonzero(new_group).tolist() + [len(order)]
 
-        # Construct the isScheduled binary variables for every possible start for every request, in the Yik
-        for yik_id in range(len(yik)):
-            r = yik[yik_id]
-            var = model.NewBoolVar(str(yik_id))
-            scheduled_vars.append(var)
-            requestLocations.append((str(r[0]), r[1], r[2], r[3], var)) # resID, start_w_idx, priority, resource, isScheduled?
+        intervals_per_resource = {}
+        presence_per_request = {}
+        objective_vars = []
+        objective_coefs = []
+        self.interval_groups = []
 
-        # Constraint 4: Each request only scheduled once
-        for rid in self.requests:
-            match = requestLocations.select(rid, '*', '*', '*', '*', '*')
-            nscheduled = [isScheduled for reqid, wnum, priority, resource, isScheduled in match]
-            model.Add(sum(nscheduled) <= 1)
+        for g in range(len(group_bounds) - 1):
+            rows = order[group_bounds[g]:group_bounds[g+1]]
+            request = int(yik.request_idx[rows[0]])
+            resource = int(yik.resource_idx[rows[0]])
+            size = int(yik.n_slices[rows[0]])
+            firsts = yik.first_slice[rows].tolist()
+            base = int(coefs[rows].min())
+            bonus = (coefs[rows] - base).tolist()
 
-        # Constraint 3: Each timeslice should only have one request in it
-        for s in aikt.keys():
-            match = tuplelist()
-            for timeslice in aikt[s]:
-                match.append(requestLocations[timeslice])
+            present = model.NewBoolVar(f"present_{request}_{resource}_{g}")
+            objective_vars.append(present)
+            objective_coefs.append(base)
+            if len(rows) == 1:
+                start = None
+                interval = model.NewOptionalFixedSizeIntervalVar(firsts[0], size, present,
+                                                                 f"interval_{request}_{resource}_{g}")
+            else:
+                start = model.NewIntVarFromDomain(cp_model.Domain.FromValues(firsts),
+                                                  f"start_{request}_{resource}_{g}")
+                interval = model.NewOptionalFixedSizeIntervalVar(start, size, present,
+                                                                 f"interval_{request}_{resource}_{g}")
+                if max(bonus) > 0:
+                    # Bonus by slice from the first start, zero between windows
+                    table = [0] * (firsts[-1] - firsts[0] + 1)
+                    for first, value in zip(firsts, bonus):
+                        table[first - firsts[0]] = value
+                    start_bonus = model.NewIntVar(0, max(bonus), f"bonus_{request}_{resource}_{g}")
+                    model.AddElement(start - firsts[0], table, start_bonus)
+                    # An absent interval can take its latest start, which earns no bonus
+                    model.Add(start_bonus <= max(bonus) * present)
+                    objective_vars.append(start_bonus)
+                    objective_coefs.append(1)
 
-            nscheduled = [isScheduled for reqid, wnum, priority, resource, isScheduled in match]
-            model.Add(sum(nscheduled) <= 1)
+            intervals_per_resource.setdefault(resource, []).append(interval)
+            presence_per_request.setdefault(request, []).append(present)
+            self.interval_groups.append((present, start, rows, firsts))
 
-        model.Maximize(sum([isScheduled * (priority + 0.1/(winidx+1.0)) for req, winidx, priority, resource, isScheduled in requestLocations]))
+        # Constraint 3: Each resource only has one request running at a time
+        for intervals in intervals_per_resource.values():
+            model.AddNoOverlap(intervals)
 
-        self.scheduled_vars = scheduled_vars
+        # Constraint 4: Each request only scheduled once
+        for presences in presence_per_request.values():
+            model.AddAtMostOne(presences)
+
+        # Redundant energy row, as NoOverlap alone gives a weak LP bound: the intervals on
+        # a resource fit within the slices that any of their possible starts cover
+        energy = {}
+        covered = {}
+        for present, start, rows, firsts in self.interval_groups:
+            resource = int(yik.resource_idx[rows[0]])
+            size = int(yik.n_slices[rows[0]])
+            energy.setdefault(resource, []).append((present, size))
+            for first in firsts:
+                covered.setdefault(resource, set()).update(range(first, first + size))
+        for resource, groups in energy.items():
+            model.Add(cp_model.LinearExpr.WeightedSum([p for p, _ in groups], [n for _, n in groups])
+                      <= len(covered[resource]))
+
+        model.Maximize(cp_model.LinearExpr.WeightedSum(objective_vars, objective_coefs))
+
+        self.scheduled_vars = None
         self.model = model
         self.log("Model constructed", 1)
 
 
+    def index_model(self):
+        aikt = self.aikt
+        self.column_vars = dict(zip(self.column_keys(), self.scheduled_vars))
+        self.request_constrs = {self.request_index.row_name(k): c
+                                for k, c in enumerate(self.request_rows)}
+        self.slice_constrs = {(aikt.resources[aikt.resource_idx[k]], int(aikt.slice_idx[k])): c
+                              for k, c in enumerate(self.slice_rows)}
+
+
+    def update_model(self, keys, added_rows, removed_keys, disabled_keys):
+        # Variables and rows cannot be deleted from a CP-SAT model, so every start that
+        # is not current is fixed to 0 instead, ready to be re-enabled if it returns.
+        # Rows of past slices are left in place, as all of their starts are fixed to 0.
+        yik = self.yik
+        model = self.model
+        proto = model.Proto()
+
+        def add_to_row(row, var):
+            linear = proto.constraints[row].linear
+            linear.vars.append(var.Index())
+            linear.coeffs.append(1)
+
+        now_slice = self.now // self.slice_size
+        for key in [key for key in self.slice_constrs if key[1] < now_slice]:
+            del self.slice_constrs[key]
+
+        for i in added_rows:
+            rid, resource, first_slice, internal_start = keys[i]
+            var = model.NewBoolVar(f"{rid}_{resource}_{internal_start}")
+            if rid in self.request_constrs:
+                add_to_row(self.request_constrs[rid], var)
+            else:
+                self.request_constrs[rid] = model.Add(var <= 1).Index()
+            for t in range(first_slice, first_slice + int(yik.n_slices[i])):
+                if (resource, t) in self.slice_constrs:
+                    add_to_row(self.slice_constrs[(resource, t)], var)
+                else:
+                    self.slice_constrs[(resource, t)] = model.Add(var <= 1).Index()
+            self.column_vars[keys[i]] = var
+
+        current = set(keys)
+        for key, var in self.column_vars.items():
+            proto.variables[var.Index()].domain[1] = 1 if key in current else 0
+
+        self.scheduled_vars = [self.column_vars[k] for k in keys]
+        model.Maximize(cp_model.LinearExpr.WeightedSum(self.scheduled_vars, self.scaled_objective(yik.objective())))
+        self.log("Model updated", 1)
+
+
+    def apply_warm_start(self, rows):
+        model = self.model
+        model.ClearHints()
+        if self.scheduled_vars is None:
+            # Interval model: hint the presence, and start, of each interval
+            chosen = set(np.asarray(rows).tolist())
+            for present, start, group_rows, firsts in self.interval_groups:
+                hinted = [k for k, row in enumerate(group_rows.tolist()) if row in chosen]
+                model.AddHint(present, 1 if hinted else 0)
+                if hinted and start is not None:
+                    model.AddHint(start, firsts[hinted[0]])
+        else:
+            hint = np.zeros(len(self.scheduled_vars), dtype=np.int64)
+            hint[rows] = 1
+            for var, value in zip(self.scheduled_vars, hint.tolist()):
+                model.AddHint(var, value)
+
+
+    def set_parameters(self, parameters):
+        parameters.num_workers = self.num_workers
+        if self.random_seed is not None:
+            parameters.random_seed = self.random_seed
+        if self.subsolvers is not None:
+            parameters.subsolvers.extend(self.subsolvers)
+        parameters.use_lns_only = self.lns_only
+
+        if self.deterministic:
+            # Interleaved workers run in a fixed order, and the time limit is counted in
+            # deterministic time, so the same seed always gives the same schedule
+            parameters.interleave_search = True
+            if self.timelimit > 0:
+                parameters.max_deterministic_time = self.timelimit
+        elif self.timelimit > 0:
+            parameters.max_time_in_seconds = self.timelimit
+
+        if self.scheduler_type == "cpsat_interval":
+            # Linearise NoOverlap and the element constraints, for a tighter LP bound
+            parameters.linearization_level = 2
+
+        for name, value in (self.cpsat_parameters or {}).items():
+            setattr(parameters, name, value)
+
+
     def solve_model(self):
     	# Solve the model, and time it
         self.solver = cp_model.CpSolver()
+        self.set_parameters(self.solver.parameters)
 
-        if self.timelimit > 0:
-            self.solver.parameters.max_time_in_seconds = self.timelimit
-
-        self.scheduler_status = self.solver.Solve(self.model)
+        status = self.solver.Solve(self.model)
 
-        if self.scheduler_status != cp_model.OPTIMAL:
-            print(f"Model Status not optimal: {self.scheduler_status}")
+        if status == cp_model.OPTIMAL:
+            self.scheduler_status = 1
+            self.log("Model optimized", 1)
+        elif status == cp_model.FEASIBLE:
+            # Stopped at the time limit or by an interrupt, so keep the best incumbent
+            self.scheduler_status = 2
+            self.log("Model stopped with an incumbent", 1)
+        else:
+            print(f"Model Status not optimal: {status}")
             return
-        self.log("Model optimized", 1)
 
+        # Undo the scaling, allowing for the rounding of each request's coefficient
+        self.bound = self.solver.BestObjectiveBound() / self.objective_scale + self.rounding_slack()
 
-    def interpret_model(self):
-        # Store the Objective value
-        self.objective_value = self.solver.ObjectiveValue()
-        print(self.objective_value)
 
+    def rounding_slack(self):
+        # The most that rounding can understate the objective of any schedule: the
+        # largest rounding loss among each request's starts, summed over the requests
+        yik = self.yik
+        coefs = yik.objective()
+        loss = coefs - np.asarray(self.scaled_objective(coefs)) / self.objective_scale
+        worst = np.zeros(len(yik.request_ids))
+        np.maximum.at(worst, yik.request_idx, loss)
+        return float(worst.sum())
+
+
+    def interpret_model(self):
         # Store which Yik_index variables have been scheduled
-        self.schedule_yik_index = [i for i in range(len(self.scheduled_vars)) if self.solver.Value(self.scheduled_vars[i]) == 1]
+        if self.scheduled_vars is None:
+            # Interval model: the possible start at the chosen start of each present interval
+            self.schedule_yik_index = []
+            for present, start, rows, firsts in self.interval_groups:
+                if self.solver.Value(present) == 1:
+                    k = 0 if start is None else firsts.index(self.solver.Value(start))
+                    self.schedule_yik_index.append(int(rows[k]))
+            self.schedule_yik_index.sort()
+        else:
+            self.schedule_yik_index = [i for i in range(len(self.scheduled_vars)) if self.solver.Value(self.scheduled_vars[i]) == 1]
+        # The unscaled objective of the chosen starts
+        self.objective_value = float(self.yik.objective()[self.schedule_yik_index].sum())
+        if self.scheduler_status == 1 and self.bound > self.objective_value + 1e-9 * max(1.0, abs(self.objective_value)):
+            # Only optimal for the rounded objective, as a smaller coefficient gap than
+            # 1/objective_scale can be lost to rounding
+            self.scheduler_status = 2
+            self.log("Optimal for the scaled objective only, within {}".format(self.bound - self.objective_value), 1)
+        self.log(self.objective_value, 1)
 
 
     def write_model(self, filename="test_model.mps"):
@@ -0,0 +1,46 @@
+from scheduler_v2 import SchedulerV2
+from scheduler_utils import greedy_dispatch
+import numpy as np
+
+class SchedulerGreedy(SchedulerV2):
+    # Dispatching works from the possible starts directly, without any slice rows
+    uses_slice_index = False
+
+    def __init__(self, now, horizon, slice_size,
+                 resources, proposals, requests, verbose=1,
+                 timelimit=0, scheduler_type=None, **kwargs):
+
+        super().__init__(now, horizon, slice_size, resources, proposals,
+            requests, verbose, timelimit, scheduler_type, **kwargs)
+
+
+    def check_scheduler_type(self):
+        if self.scheduler_type != "greedy":
+            print("ERROR: Mismatched scheduler_type. '{}' should be 'greedy'.".format(self.scheduler_type))
+
+
+    def build_model(self):
+        self.log("No model to construct for greedy dispatch", 1)
+
+
+    def apply_warm_start(self, rows):
+        # Dispatching does not start from an existing schedule
+        return
+
+
+    def solve_model(self):
+        self.schedule_yik_index = np.array(greedy_dispatch(self.yik), dtype=np.int64)
+        self.scheduler_status = 2 # Feasible, with no proof of optimality
+        self.log("Greedy dispatch scheduled {} requests".format(len(self.schedule_yik_index)), 1)
+
+
+    def interpret_model(self):
+        self.objective_value = float(self.yik.objective()[self.schedule_yik_index].sum())
+
+
+    def write_model(self, filename="test_model.mps"):
+        print("Write_Model Failed: greedy dispatch does not build a model.")
+
+
+    def load_model(self, filename="test_model.mps"):
+        print("Load_Model Failed: greedy dispatch does not build a model.")
@@ -1,15 +1,18 @@
 from scheduler_v2 import SchedulerV2
-from gurobipy import Model, GRB, tuplelist, quicksum
+from gurobipy import Model, GRB, MVar, Column, LinExpr
 from gurobipy import read as gurobi_read_model
 from gurobipy import Env as gpEnv
+import numpy as np
 
 class SchedulerGurobi(SchedulerV2):
+    supports_incremental = True
+
     def __init__(self, now, horizon, slice_size, 
                  resources, proposals, requests, verbose=1,
-                 timelimit=0, scheduler_type=None):
+                 timelimit=0, scheduler_type=None, **kwargs):
 
         super().__init__(now, horizon, slice_size, resources, proposals,
-            requests, verbose, timelimit, scheduler_type)
+            requests, verbose, timelimit, scheduler_type, **kwargs)
 
         self.env = gpEnv(empty=True)
         self.env.setParam("OutputFlag", 0)
@@ -18,50 +21,29 @@ class SchedulerGurobi(SchedulerV2):
 
     def check_scheduler_type(self):
         if self.scheduler_type != "gurobi":
-            print("ERROR: Mismatched scheduler_type. '{}' should be 'gurobi'.".format(scheduler_type))
+            print("ERROR: Mismatched scheduler_type. '{}' should be 'gurobi'.".format(self.scheduler_type))
 
 
     def build_model(self):
-        yik = self.yik
-        aikt = self.aikt
+        pm = self.packing_model()
+        n_request_rows = pm.n_request_rows
 
         m = Model("Test Schedule", env=self.env)
 
-        requestLocations = tuplelist()
-        scheduled_vars = []
-
-        for i in range(len(yik)):
-            r = yik[i]
-            var = m.addVar(vtype=GRB.BINARY, name="isSched_"+str(i))
-            scheduled_vars.append(var)
-            requestLocations.append((str(r[0]), r[1], r[2], r[3], var)) # resID, start_w_idx, priority, resource, isScheduled?
-        m.update()
+        # One isScheduled binary variable per possible start, with its objective coefficient
+        scheduled_vars = m.addMVar(pm.num_col, lb=pm.col_lower, ub=pm.col_upper, vtype=GRB.BINARY,
+                                   obj=pm.objective, name="isSched")
 
         # Constraint 4: Each request only scheduled once
-        for rid in self.requests:
-            match = requestLocations.select(rid, '*', '*', '*', '*', '*')
-            nscheduled = quicksum([isScheduled for reqid, wnum, priority, resource, isScheduled in match])
-            m.addConstr(nscheduled <= 1, f'one_per_reqid_constraint_{rid}')
-        m.update()
+        self.request_rows = m.addMConstr(pm.request_rows, scheduled_vars, '<', pm.row_upper[:n_request_rows],
+                                         name="one_per_reqid_constraint")
 
         # Constraint 3: Each timeslice should only have one request in it
-        for s in aikt.keys():
-            match = tuplelist()
-            for timeslice in aikt[s]:
-                match.append(requestLocations[timeslice])
-            nscheduled = quicksum(isScheduled for reqid, winidx, priority, resource, isScheduled in match)
-            m.addConstr(nscheduled <= 1, f"one_per_slice_constrain_{s}")
-
-        objective = quicksum([isScheduled * (priority + 0.1/(winidx+1.0)) for req, winidx, priority, resource, isScheduled in requestLocations])
+        self.slice_rows = m.addMConstr(pm.slice_rows, scheduled_vars, '<', pm.row_upper[n_request_rows:],
+                                       name="one_per_slice_constraint")
 
-        m.setObjective(objective)
         m.modelSense = GRB.MAXIMIZE
 
-        # Implement a timelimit? (Do I actually want to do this?)
-        timelimit = 0 # NOTE: Hardcode out for now.
-        if timelimit > 0:
-            m.params.timeLimit = timelimit
-
         # Set the tolerance of the solution
         m.params.MIPGap = 0.01
 
@@ -70,20 +52,90 @@ class SchedulerGurobi(SchedulerV2):
 
         # If specified, set a time limit
         if self.timelimit > 0:
-            m.setParam('TimeLimit', timelimit)
+            m.setParam('TimeLimit', self.timelimit)
 
         m.update()
 
+        self.scheduled_vars = scheduled_vars
         self.model = m
         self.log("Model constructed", 1)
 
 
+    def index_model(self):
+        aikt = self.aikt
+        self.column_vars = dict(zip(self.column_keys(), self.scheduled_vars.tolist()))
+        self.request_constrs = {self.request_index.row_name(k): c
+                                for k, c in enumerate(self.request_rows.tolist())}
+        self.slice_constrs = {(aikt.resources[aikt.resource_idx[k]], int(aikt.slice_idx[k])): c
+                              for k, c in enumerate(self.slice_rows.tolist())}
+
+
+    def update_model(self, keys, added_rows, removed_keys, disabled_keys):
+        yik = self.yik
+        m = self.model
+
+        # Starts that no longer exist are removed, those on closed resources only disabled
+        for k in removed_keys:
+            m.remove(self.column_vars.pop(k))
+        for k in disabled_keys:
+            self.column_vars[k].UB = 0
+
+        # Drop the rows of finished requests and of slices that are now in the past
+        live_requests = {k[0] for k in keys} | {k[0] for k in self.column_vars}
+        for rid in [rid for rid in self.request_constrs if rid not in live_requests]:
+            m.remove(self.request_constrs.pop(rid))
+        now_slice = self.now // self.slice_size
+        for key in [key for key in self.slice_constrs if key[1] < now_slice]:
+            m.remove(self.slice_constrs.pop(key))
+
+        # Add the new starts as columns of the existing rows, creating any missing rows
+        for i in added_rows:
+            rid, resource, first_slice, internal_start = keys[i]
+            if rid not in self.request_constrs:
+                self.request_constrs[rid] = m.addConstr(LinExpr() <= 1,
+                                                        name=f"one_per_reqid_constraint_{rid}")
+            constrs = [self.request_constrs[rid]]
+            for t in range(first_slice, first_slice + int(yik.n_slices[i])):
+                if (resource, t) not in self.slice_constrs:
+                    self.slice_constrs[(resource, t)] = m.addConstr(LinExpr() <= 1,
+                        name=f"one_per_slice_constraint_{resource}_{t}")
+                constrs.append(self.slice_constrs[(resource, t)])
+            self.column_vars[keys[i]] = m.addVar(vtype=GRB.BINARY, name=f"isSched_{rid}_{internal_start}",
+                                                 column=Column([1.0]*len(constrs), constrs))
+
+        # Re-enable every current start, and refresh the objective coefficients
+        current = [self.column_vars[k] for k in keys]
+        m.setAttr("UB", current, [1.0]*len(current))
+        m.setAttr("Obj", current, yik.objective().tolist())
+        m.update()
+
+        self.scheduled_vars = MVar.fromlist(current)
+        self.log("Model updated", 1)
+
+
+    def apply_warm_start(self, rows):
+        # MIP start: every start not in the warm start schedule begins at 0
+        start = np.zeros(len(self.yik))
+        start[rows] = 1
+        m = self.model
+        m.setAttr("Start", m.getVars(), [0.0]*m.NumVars)
+        self.scheduled_vars.Start = start
+
+
     def solve_model(self):
-        self.model.optimize()
-        if self.model.Status != GRB.OPTIMAL:
-            print("Model Status not optimal:", self.model.Status)
+        m = self.model
+        m.optimize()
+        if m.Status == GRB.OPTIMAL:
+            self.scheduler_status = 1
+            self.log("Model optimized", 1)
+        elif m.SolCount > 0:
+            # Stopped early (time limit, interrupt, ...), so keep the best incumbent
+            self.scheduler_status = 2
+            self.log("Model stopped with an incumbent, status {}".format(m.Status), 1)
+        else:
+            print("Model Status not optimal:", m.Status)
             return
-        self.log("Model optimized", 1)
+        self.bound = m.ObjBound
 
 
     def interpret_model(self):
@@ -91,12 +143,8 @@ class SchedulerGurobi(SchedulerV2):
         self.objective_value = self.model.ObjVal
 
         # Store which Yik_index variables have been scheduled
-        solution = self.model.getAttr('X')
-        self.schedule_yik_index = []
-        for i in range(len(self.yik)):
-            var_index = self.model.getVarByName("isSched_{}".format(i)).index
-            if solution[var_index] == 1:
-                self.schedule_yik_index.append(i)
+        solution = self.scheduled_vars.X
+        self.schedule_yik_index = np.flatnonzero(solution > 0.5)
 
 
     def write_model(self, filename="test_model.mps"):
@@ -106,4 +154,5 @@ class SchedulerGurobi(SchedulerV2):
 
     def load_model(self, filename="test_model.mps"):
         self.model = gurobi_read_model(filename, env=self.env)
+        self.scheduled_vars = MVar.fromlist(self.model.getVars())
         
\ No newline at end of file
@@ -1,45 +1,98 @@
-from scheduler_gurobi import SchedulerGurobi
+from scheduler_v2 import SchedulerV2
+import numpy as np
 import highspy
-import time
 
-class SchedulerHighs(SchedulerGurobi):
-    def __init__(self, now, horizon, slice_size, 
+class SchedulerHighs(SchedulerV2):
+    def __init__(self, now, horizon, slice_size,
                  resources, proposals, requests, verbose=1,
-                 timelimit=0, scheduler_type=None):
+                 timelimit=0, scheduler_type=None, **kwargs):
 
         super().__init__(now, horizon, slice_size, resources, proposals,
-            requests, verbose, timelimit, scheduler_type)
+            requests, verbose, timelimit, scheduler_type, **kwargs)
 
 
     def check_scheduler_type(self):
         if self.scheduler_type != "highs":
-            print("ERROR: Mismatched scheduler_type: '{}'. Currently using HiGHS Scheduler.".format(scheduler_type))
+            print("ERROR: Mismatched scheduler_type: '{}'. Currently using HiGHS Scheduler.".format(self.scheduler_type))
 
 
-    def time_solve_model(self):
-    	start_read_write = time.time()
-    	self.write_model("highs_temp.mps")
-    	self.h = highspy.Highs()
-    	self.h.readModel("highs_temp.mps")
-    	end_read_write = time.time()
-    	self.read_write_time = end_read_write - start_read_write
+    def build_model(self):
+        # Hand the packing model to HiGHS in memory, as a rowwise matrix
+        pm = self.packing_model()
 
-    	start_solve = time.time()
-    	self.solve_model()
-    	end_solve = time.time()
-    	self.solve_time = end_solve - start_solve
+        lp = highspy.HighsLp()
+        lp.num_col_ = pm.num_col
+        lp.num_row_ = pm.num_row
+        lp.sense_ = highspy.ObjSense.kMaximize
+        lp.col_cost_ = pm.objective
+        lp.col_lower_ = pm.col_lower
+        lp.col_upper_ = pm.col_upper
+        lp.row_lower_ = np.maximum(pm.row_lower, -highspy.kHighsInf)
+        lp.row_upper_ = pm.row_upper
+        lp.integrality_ = [highspy.HighsVarType.kInteger] * pm.num_col
+
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+        lp.a_matrix_.num_col_ = pm.num_col
+        lp.a_matrix_.num_row_ = pm.num_row
+        lp.a_matrix_.start_ = pm.A.indptr
+        lp.a_matrix_.index_ = pm.A.indices
+        lp.a_matrix_.value_ = pm.A.data
+
+        self.h = highspy.Highs()
+        # Solver logs only at the most verbose level, as for the other backends
+        self.h.setOptionValue('output_flag', self.verbose_level >= 2)
+        self.h.passModel(lp)
+        self.log("Model constructed", 1)
+
+
+    def apply_warm_start(self, rows):
+        solution = highspy.HighsSolution()
+        col_value = np.zeros(len(self.yik))
+        col_value[rows] = 1
+        solution.col_value = col_value.tolist()
+        self.h.setSolution(solution)
 
 
     def solve_model(self):
         if self.timelimit > 0:
-            self.h.setOptionValue('time_limit', self.timelimit)
+            self.h.setOptionValue('time_limit', float(self.timelimit))
         self.h.run()
 
+        status = self.h.getModelStatus()
+        info = self.h.getInfo()
+        if status == highspy.HighsModelStatus.kModelEmpty:
+            # No possible starts at all, so the empty schedule is optimal
+            self.scheduler_status = 1
+            self.bound = 0.0
+            self.log("Model empty", 1)
+            return
+        if status == highspy.HighsModelStatus.kOptimal:
+            self.scheduler_status = 1
+            self.log("Model optimized", 1)
+        elif info.primal_solution_status == highspy.SolutionStatus.kSolutionStatusFeasible:
+            # Stopped at a limit or by an interrupt, so keep the best incumbent
+            self.scheduler_status = 2
+            self.log("Model stopped with an incumbent: {}".format(self.h.modelStatusToString(status)), 1)
+        else:
+            print("Model Status not optimal:", self.h.modelStatusToString(status))
+            return
+        self.bound = info.mip_dual_bound
+
 
     def interpret_model(self):
-    	solution = self.h.getSolution().col_value
-    	info = self.h.getInfo()
-    	self.objective_value = info.objective_function_value
+        solution = np.asarray(self.h.getSolution().col_value)
+        info = self.h.getInfo()
+        self.objective_value = info.objective_function_value
+
+        self.schedule_yik_index = np.flatnonzero(solution > 0.5)
+
+
+    def write_model(self, filename="test_model.mps"):
+        self.h.writeModel(filename)
+        self.log(f"Model written to file: {filename}", 1)
+
 
-    	self.schedule_yik_index = [i for i in range(len(self.yik)) if solution[i]==1]
-        
\ No newline at end of file
+    def load_model(self, filename="test_model.mps"):
+        self.h = highspy.Highs()
+        self.h.setOptionValue('output_flag', self.verbose_level >= 2)
+        self.h.readModel(filename)
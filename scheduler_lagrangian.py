@@ -0,0 +1,59 @@
+from scheduler_v2 import SchedulerV2
+from scheduler_utils import LagrangianRelaxation
+
+class SchedulerLagrangian(SchedulerV2):
+    # The relaxation works per resource from the possible starts, without any slice rows
+    uses_slice_index = False
+
+    def __init__(self, now, horizon, slice_size,
+                 resources, proposals, requests, verbose=1,
+                 timelimit=0, scheduler_type=None, **kwargs):
+
+        super().__init__(now, horizon, slice_size, resources, proposals,
+            requests, verbose, timelimit, scheduler_type, **kwargs)
+
+        self.max_iterations = 200
+        self.relaxation = None
+
+
+    def check_scheduler_type(self):
+        if self.scheduler_type != "lagrangian":
+            print("ERROR: Mismatched scheduler_type. '{}' should be 'lagrangian'.".format(self.scheduler_type))
+
+
+    def solver_params(self):
+        return {"max_iterations": self.max_iterations}
+
+
+    def build_model(self):
+        self.relaxation = LagrangianRelaxation(self.yik)
+        self.log("Lagrangian relaxation constructed", 1)
+
+
+    def apply_warm_start(self, rows):
+        # The warm start is the first feasible schedule to improve on
+        self.relaxation.best_rows = rows
+        self.relaxation.best_value = float(self.yik.objective()[rows].sum())
+
+
+    def solve_model(self):
+        self.relaxation.run(self.max_iterations, self.timelimit)
+        self.bound = self.relaxation.bound
+        # Optimal once the best schedule meets the bound
+        proven = self.bound - self.relaxation.best_value <= 1e-4 * max(abs(self.relaxation.best_value), 1.0)
+        self.scheduler_status = 1 if proven else 2
+        self.log("Lagrangian relaxation: {} iterations, bound {}, best schedule {}".format(
+            self.relaxation.iterations, self.bound, self.relaxation.best_value), 1)
+
+
+    def interpret_model(self):
+        self.schedule_yik_index = self.relaxation.best_rows
+        self.objective_value = self.relaxation.best_value
+
+
+    def write_model(self, filename="test_model.mps"):
+        print("Write_Model Failed: the Lagrangian relaxation does not build a model.")
+
+
+    def load_model(self, filename="test_model.mps"):
+        print("Load_Model Failed: the Lagrangian relaxation does not build a model.")
@@ -0,0 +1,190 @@
+from scheduler_v2 import SchedulerV2
+from scheduler_cpsat import SchedulerCPSAT
+from scheduler_highs import SchedulerHighs
+from scheduler_utils import greedy_dispatch
+import numpy as np
+import random
+import time
+
+class SchedulerLNS(SchedulerV2):
+    # Conflicts with the fixed part of the schedule are found from slice occupancy,
+    # and each sub-model builds its own slice rows
+    uses_slice_index = False
+
+    def __init__(self, now, horizon, slice_size,
+                 resources, proposals, requests, verbose=1,
+                 timelimit=0, scheduler_type=None, **kwargs):
+
+        super().__init__(now, horizon, slice_size, resources, proposals,
+            requests, verbose, timelimit, scheduler_type, **kwargs)
+
+        self.default_timelimit = 10         # Wall-clock budget when no timelimit is given
+        self.neighbourhood_timelimit = 1.0  # Budget for each sub-model
+        self.band_fraction = 0.1            # Initial width of a time band, as a fraction of the planning span
+        self.stall_iterations = 20          # Widen the time bands after this many iterations without improvement
+        self.seed = 0
+        self.lns_stats = {}
+
+
+    def check_scheduler_type(self):
+        if self.scheduler_type not in ("lns_cpsat", "lns_highs"):
+            print("ERROR: Mismatched scheduler_type. '{}' should be 'lns_cpsat' or 'lns_highs'.".format(self.scheduler_type))
+
+
+    def solver_params(self):
+        return {"default_timelimit": self.default_timelimit,
+                "neighbourhood_timelimit": self.neighbourhood_timelimit,
+                "band_fraction": self.band_fraction,
+                "stall_iterations": self.stall_iterations,
+                "seed": self.seed}
+
+
+    def build_model(self):
+        # The sub-models are solved by a scheduler of their own, reused between iterations
+        sub_types = {"lns_cpsat": (SchedulerCPSAT, "cpsat"), "lns_highs": (SchedulerHighs, "highs")}
+        Scheduler, sub_type = sub_types[self.scheduler_type]
+        args = self.component_args(self.yik.request_ids)
+        args["scheduler_type"] = sub_type
+        args["warm_start"] = None
+        self.sub_scheduler = Scheduler(**args)
+
+        # Start from greedy dispatch, or the warm start if that is better
+        objective = self.yik.objective()
+        self.current = np.array(greedy_dispatch(self.yik), dtype=np.int64)
+        if self.warm_start is not None:
+            rows = self.warm_start_rows()
+            if objective[rows].sum() > objective[self.current].sum():
+                self.current = rows
+        self.log("LNS starting from an objective of {}".format(objective[self.current].sum()), 1)
+
+
+    def apply_warm_start(self, rows):
+        # The warm start is used as the starting schedule in build_model
+        return
+
+
+    def neighbourhood(self, rng, band_fraction):
+        # Rows of one randomly chosen region: a resource over a time band,
+        # every resource over a time band, or all of one proposal's requests
+        yik = self.yik
+        start_time = yik.first_slice * self.slice_size
+        span_start = start_time.min(initial=0)
+        span = max(start_time.max(initial=0) - span_start, self.slice_size)
+        band = span * band_fraction
+
+        kind = rng.choice(("resource_band", "time_band", "proposal"))
+        if kind == "proposal":
+            proposal = rng.choice(list(self.proposals.keys()))
+            in_proposal = np.array([self.requests[i]["proposal"] == proposal for i in yik.request_ids])
+            return kind, in_proposal[yik.request_idx]
+
+        band_start = span_start + rng.random() * max(span - band, 0)
+        region = (start_time >= band_start) & (start_time < band_start + band)
+        if kind == "resource_band":
+            region &= yik.resource_idx == rng.randrange(len(yik.resources))
+        return kind, region
+
+
+    def improve(self, region, timelimit):
+        # Free the scheduled requests whose start lies in 'region', and re-solve the
+        # region for them and all unscheduled requests, keeping the rest fixed.
+        # Returns the new schedule if it is better, otherwise None.
+        yik = self.yik
+        objective = yik.objective()
+        current = self.current
+
+        freed = current[region[current]]
+        kept = current[~region[current]]
+        scheduled_request = np.zeros(len(yik.request_ids), dtype=bool)
+        scheduled_request[yik.request_idx[kept]] = True
+
+        n_slices = int((yik.first_slice + yik.n_slices).max(initial=0))
+        occupied = np.zeros((len(yik.resources), n_slices + 1), dtype=np.int64)
+        for i in kept.tolist():
+            occupied[yik.resource_idx[i], yik.first_slice[i]:yik.first_slice[i] + yik.n_slices[i]] = 1
+        prefix = np.zeros((occupied.shape[0], occupied.shape[1] + 1), dtype=np.int64)
+        np.cumsum(occupied, axis=1, out=prefix[:, 1:])
+        clash = (prefix[yik.resource_idx, yik.first_slice + yik.n_slices]
+                 - prefix[yik.resource_idx, yik.first_slice]) > 0
+
+        rows = np.flatnonzero(region & ~scheduled_request[yik.request_idx] & ~clash)
+        if len(rows) == 0:
+            return None
+
+        sub = self.sub_scheduler
+        sub.timelimit = timelimit
+        sub.warm_start = self.schedule_dict(freed)
+        status, sub_rows, _, _, _ = sub.solve_table(yik.take(rows).compact_requests())
+        if status not in (1, 2):
+            return None
+
+        chosen = rows[sub_rows]
+        if objective[chosen].sum() <= objective[freed].sum() + 1e-9:
+            return None
+        return np.sort(np.concatenate([kept, chosen]))
+
+
+    def schedule_dict(self, rows):
+        # The minimal scheduled_requests form of the given rows, to use as a warm start
+        yik = self.yik
+        scheduled = {}
+        for i in rows.tolist():
+            rid = self.requests[yik.request_ids[yik.request_idx[i]]]["resID"]
+            scheduled[str(rid)] = {"rID": rid, "resource": yik.resources[yik.resource_idx[i]],
+                                   "start": yik.internal_start[i]}
+        return {"scheduled": scheduled, "now": self.now}
+
+
+    def solve_model(self):
+        # Anytime loop: improve one neighbourhood at a time until the budget runs out
+        budget = self.timelimit if self.timelimit > 0 else self.default_timelimit
+        deadline = time.time() + budget
+        rng = random.Random(self.seed)
+        objective = self.yik.objective()
+
+        initial_objective = float(objective[self.current].sum())
+        band_fraction = self.band_fraction
+        iterations = 0
+        stalled = 0
+        improvements = {}
+        while len(self.yik) > 0:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            iterations += 1
+            kind, region = self.neighbourhood(rng, band_fraction)
+            improved = self.improve(region, min(self.neighbourhood_timelimit, remaining))
+            if improved is not None:
+                self.current = improved
+                improvements[kind] = improvements.get(kind, 0) + 1
+                stalled = 0
+                self.log("LNS iteration {}: {} improved the objective to {}".format(
+                    iterations, kind, objective[improved].sum()), 2)
+            else:
+                stalled += 1
+                if stalled >= self.stall_iterations:
+                    # Stuck in a local optimum of this neighbourhood size, so widen it
+                    band_fraction = min(band_fraction * 1.5, 1.0)
+                    stalled = 0
+
+        self.lns_stats = {"iterations": iterations, "improvements": improvements,
+                          "band_fraction": band_fraction,
+                          "initial_objective": initial_objective,
+                          "final_objective": float(objective[self.current].sum())}
+        self.log("LNS: {} iterations, objective {} -> {}".format(
+            iterations, initial_objective, self.lns_stats["final_objective"]), 1)
+
+        self.scheduler_status = 2 # Feasible, with no proof of optimality
+
+
+    def interpret_model(self):
+        self.schedule_yik_index = self.current
+        self.objective_value = float(self.yik.objective()[self.current].sum())
+
+
+    def write_model(self, filename="test_model.mps"):
+        print("Write_Model Failed: LNS only builds models of neighbourhoods.")
+
+
+    def load_model(self, filename="test_model.mps"):
+        print("Load_Model Failed: LNS only builds models of neighbourhoods.")
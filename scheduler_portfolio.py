@@ -0,0 +1,166 @@
+from scheduler_v2 import SchedulerV2
+from scheduler_gurobi import SchedulerGurobi
+from scheduler_cpsat import SchedulerCPSAT
+from scheduler_highs import SchedulerHighs
+from scheduler_pulp import SchedulerPulp
+from scheduler_scipy import SchedulerScipy
+from scheduler_scip import SchedulerSCIP
+from multiprocessing import Process, Queue
+import os
+import queue
+import signal
+import time
+
+class SchedulerPortfolio(SchedulerV2):
+    # Each backend builds its own slice rows from the prepared possible starts
+    uses_slice_index = False
+
+    backend_types = {
+        "gurobi": SchedulerGurobi,
+        "cpsat": SchedulerCPSAT,
+        "highs": SchedulerHighs,
+        "cbc": SchedulerPulp,
+        "scip": SchedulerPulp,
+        "scipy": SchedulerScipy,
+        "scip_native": SchedulerSCIP
+    }
+
+    def __init__(self, now, horizon, slice_size,
+                 resources, proposals, requests, verbose=1,
+                 timelimit=0, scheduler_type=None, backends=("cpsat", "highs", "gurobi"), **kwargs):
+
+        super().__init__(now, horizon, slice_size, resources, proposals,
+            requests, verbose, timelimit, scheduler_type, **kwargs)
+
+        self.backends = list(backends)
+        self.grace_time = 5 # Seconds to wait for results past the time limit before killing the backends
+        self.poll_interval = 0.1 # Seconds between checks that the backends are still running
+        # Backends report optimal at their own MIP gaps (Gurobi stops at 1%), so a
+        # schedule only counts as proven optimal within this relative gap to its bound
+        self.gap_tolerance = 1e-4
+        self.portfolio_winner = None
+        self.portfolio_results = {}
+
+
+    def check_scheduler_type(self):
+        if self.scheduler_type != "portfolio":
+            print("ERROR: Mismatched scheduler_type. '{}' should be 'portfolio'.".format(self.scheduler_type))
+
+
+    def solver_params(self):
+        return {"backends": self.backends, "gap_tolerance": self.gap_tolerance}
+
+
+    def build_model(self):
+        self.race_table = self.yik.compact_requests()
+        self.log("Racing {} on {} possible starts".format(", ".join(self.backends), len(self.yik)), 1)
+
+
+    def apply_warm_start(self, rows):
+        # Each backend applies the warm start itself
+        return
+
+
+    def solve_model(self):
+        # Race every backend on the same possible starts in a process of its own.
+        # The first proven-optimal schedule wins, otherwise the best one returned
+        # by the time limit. The remaining backends, and any solver binaries they
+        # started, are then killed.
+        results = Queue()
+        processes = {}
+        for backend in self.backends:
+            args = self.component_args(self.race_table.request_ids)
+            args["scheduler_type"] = backend
+            processes[backend] = Process(target=race_backend,
+                                         args=(results, backend, self.backend_types[backend], args, self.race_table))
+            processes[backend].start()
+
+        deadline = time.time() + self.timelimit + self.grace_time if self.timelimit > 0 else None
+        objective = self.race_table.objective()
+        self.portfolio_results = {}
+        self.portfolio_winner = None
+        exited = set()
+        pending = set(processes)
+        while pending and (deadline is None or time.time() < deadline):
+            try:
+                backend, status, rows, bound, build_time, solve_time = results.get(timeout=self.poll_interval)
+            except queue.Empty:
+                # A backend that died without reporting would leave the race waiting forever.
+                # Its result may still be in the queue, so it is only dropped on the next poll.
+                for backend in [b for b in pending if processes[b].exitcode is not None]:
+                    if backend in exited:
+                        print("Portfolio backend '{}' exited without a result (exit code {})".format(
+                            backend, processes[backend].exitcode))
+                        pending.discard(backend)
+                    exited.add(backend)
+                continue
+            pending.discard(backend)
+            self.portfolio_results[backend] = {
+                "status": status,
+                "rows": rows,
+                "objective": float(objective[rows].sum()) if rows is not None else None,
+                "bound": bound,
+                "build_time": build_time,
+                "solve_time": solve_time
+            }
+            if status == 1 and self.within_gap(self.portfolio_results[backend]["objective"], bound):
+                self.portfolio_winner = backend
+                break
+
+        for process in processes.values():
+            kill_backend(process)
+            process.join()
+
+        if self.portfolio_winner is None:
+            solved = [b for b, r in self.portfolio_results.items() if r["rows"] is not None]
+            if len(solved) == 0:
+                print("Model Status not optimal: no backend returned a schedule")
+                return
+            self.portfolio_winner = max(solved, key=lambda b: self.portfolio_results[b]["objective"])
+
+        # Every backend's bound holds, so report the tightest
+        bounds = [r["bound"] for r in self.portfolio_results.values() if r["bound"] is not None]
+        self.bound = min(bounds) if bounds else None
+        winner = self.portfolio_results[self.portfolio_winner]
+        self.scheduler_status = 1 if self.within_gap(winner["objective"], self.bound) else 2
+        self.log("Portfolio won by {}".format(self.portfolio_winner), 1)
+
+
+    def within_gap(self, objective, bound):
+        return bound is not None and bound - objective <= self.gap_tolerance * max(1.0, abs(objective))
+
+
+    def interpret_model(self):
+        result = self.portfolio_results[self.portfolio_winner]
+        self.schedule_yik_index = result["rows"]
+        self.objective_value = result["objective"]
+
+
+    def write_model(self, filename="test_model.mps"):
+        print("Write_Model Failed: each backend of the portfolio builds its own model.")
+
+
+    def load_model(self, filename="test_model.mps"):
+        print("Load_Model Failed: each backend of the portfolio builds its own model.")
+
+
+def kill_backend(process):
+    # Each backend leads its own process group, so solver binaries run by the
+    # command-line backends (e.g. CBC through PuLP) are killed along with it
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        # Already gone, or killed before it could start its own group
+        if process.is_alive():
+            process.terminate()
+
+
+def race_backend(results, backend, Scheduler, scheduler_args, yik):
+    # Runs in a process of its own: solve with one backend and report back
+    os.setpgrp()
+    try:
+        status, rows, bound, build_time, solve_time = Scheduler(**scheduler_args).solve_table(yik)
+    except Exception as e:
+        print("Portfolio backend '{}' failed: {}".format(backend, e))
+        status, rows, bound, build_time, solve_time = None, None, None, None, None
+    results.put((backend, status, rows, bound, build_time, solve_time))
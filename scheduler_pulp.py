@@ -1,54 +1,38 @@
 from scheduler_v2 import SchedulerV2
 import pulp as pl
-from gurobipy import tuplelist
 
 class SchedulerPulp(SchedulerV2):
     def __init__(self, now, horizon, slice_size, 
                  resources, proposals, requests, verbose=0,
-                 timelimit=0, scheduler_type=None):
+                 timelimit=0, scheduler_type=None, **kwargs):
 
         super().__init__(now, horizon, slice_size, resources, proposals,
-                         requests, verbose, timelimit, scheduler_type)
+                         requests, verbose, timelimit, scheduler_type, **kwargs)
+
+        self.solver_name = None # The PuLP solver used, once solved
 
 
     def check_scheduler_type(self):
-        if self.scheduler_type not in ("cbc", "scip", "gurobi_pulp", "gurobi_pulp_cmd"):
-            print("ERROR: Mismatched scheduler_type: '{}'. Currently using PuLP Scheduler.".format(scheduler_type))
+        if self.scheduler_type not in ("cbc", "scip", "highs_pulp", "gurobi_pulp", "gurobi_pulp_cmd"):
+            print("ERROR: Mismatched scheduler_type: '{}'. Currently using PuLP Scheduler.".format(self.scheduler_type))
 
 
     def build_model(self):
-        yik = self.yik
-        aikt = self.aikt
+        pm = self.packing_model()
 
         m = pl.LpProblem("test_schedule", pl.LpMaximize)
 
-        requestLocations = tuplelist()
-        scheduled_vars = []
-
         # Construct the isScheduled binary variables for every possible start for every request, in the Yik
-        for yik_id in range(len(yik)):
-            r = yik[yik_id]
-            var = pl.LpVariable(name="BIN_"+str(yik_id), cat="Binary")
-            scheduled_vars.append(var)
-            requestLocations.append((str(r[0]), r[1], r[2], r[3], var)) # resID, start_w_idx, priority, resource, isScheduled?
-
-        # Constraint 4: Each request only scheduled once
-        for rid in self.requests:
-            match = requestLocations.select(rid, '*', '*', '*', '*', '*')
-            nscheduled = pl.LpAffineExpression({isScheduled: 1 for reqid, wnum, priority, resource, isScheduled in match})
-            constraint = pl.LpConstraint(nscheduled, -1, f"one_per_reqid_constraint_{rid}", 1)
-            m.addConstraint(constraint)
+        scheduled_vars = [pl.LpVariable(name=pm.col_name(i), cat="Binary") for i in range(pm.num_col)]
 
+        # Constraint 4: Each request only scheduled once, then
         # Constraint 3: Each timeslice should only have one request in it
-        for s in aikt.keys():
-            match = tuplelist()
-            for timeslice in aikt[s]:
-                match.append(requestLocations[timeslice])
-            nscheduled = pl.LpAffineExpression({isScheduled: 1 for reqid, winidx, priority, resource, isScheduled in match})
-            constraint = pl.LpConstraint(nscheduled, -1, f"one_per_slice_constraint_{s}", 1)
-            m.addConstraint(constraint)
+        upper = pm.row_upper.tolist()
+        for k, cols in enumerate(pm.rows()):
+            nscheduled = pl.LpAffineExpression({scheduled_vars[i]: 1 for i in cols})
+            m.addConstraint(pl.LpConstraint(nscheduled, pl.LpConstraintLE, pm.row_name(k), upper[k]))
 
-        objective = pl.LpAffineExpression({isScheduled: (priority + 0.1/(winidx+1.0)) for req, winidx, priority, resource, isScheduled in requestLocations})
+        objective = pl.LpAffineExpression(zip(scheduled_vars, pm.objective.tolist()))
 
         m.setObjective(objective)
 
@@ -67,28 +51,51 @@ class SchedulerPulp(SchedulerV2):
         var_names, self.model = pl.LpProblem.fromMPS(filename, pl.LpMaximize)
 
 
+    def apply_warm_start(self, rows):
+        chosen = set(rows.tolist())
+        for i, var in enumerate(self.scheduled_vars):
+            var.setInitialValue(1 if i in chosen else 0)
+
+
     def getSolver(self):
+        # In-process solver APIs first, which take the model in memory, falling back to
+        # the command-line solver (via model and solution files) if their package is missing
         solvers_dict = {
-            "cbc": "PULP_CBC_CMD",
-            "scip": "SCIP_CMD",
-            "highs": "HiGHS_CMD",
-            "gurobi_pulp": "GUROBI",
-            "gurobi_pulp_cmd": "GUROBI_CMD"
+            "cbc": ["PULP_CBC_CMD"],
+            "scip": ["SCIP_PY", "SCIP_CMD"],
+            "highs_pulp": ["HiGHS", "HiGHS_CMD"],
+            "gurobi_pulp": ["GUROBI"],
+            "gurobi_pulp_cmd": ["GUROBI_CMD"]
         }
-        solver_name = solvers_dict[self.scheduler_type]
-        if self.timelimit > 0:
-            solver = pl.getSolver(solver_name, timeLimit=self.timelimit)
-        else:
-            # No time limit
-            solver = pl.getSolver(solver_name)
+        # Solvers that accept a starting solution
+        warm_start_solvers = {"PULP_CBC_CMD", "SCIP_PY", "HiGHS_CMD", "GUROBI", "GUROBI_CMD"}
+
+        for solver_name in solvers_dict[self.scheduler_type]:
+            options = {"msg": self.verbose_level >= 2}
+            if self.timelimit > 0:
+                options["timeLimit"] = self.timelimit
+            if self.warm_start is not None and solver_name in warm_start_solvers:
+                # Initial values are only passed on to the solver with warmStart
+                options["warmStart"] = True
+            solver = pl.getSolver(solver_name, **options)
+            if solver.available():
+                break
+        self.solver_name = solver_name
+        self.log("Solving with PuLP's {}".format(solver_name), 1)
         return solver
 
 
     def solve_model(self):
         solver = self.getSolver()
-        self.scheduler_status = self.model.solve(solver)
-        if self.scheduler_status != 1:
-            print(f"Model Status not optimal: {self.scheduler_status}")
+        status = self.model.solve(solver)
+        if self.model.sol_status == pl.LpSolutionOptimal:
+            self.scheduler_status = 1
+        elif self.model.sol_status == pl.LpSolutionIntegerFeasible:
+            # Stopped at the time limit with an incumbent
+            self.scheduler_status = 2
+        else:
+            self.scheduler_status = status
+            print(f"Model Status not optimal: {status}")
             return
 
 
@@ -97,5 +104,5 @@ class SchedulerPulp(SchedulerV2):
 
         self.schedule_yik_index = []
         for i in range(len(self.yik)):
-            if self.scheduled_vars[i].value() == 1:
+            if self.scheduled_vars[i].value() > 0.5:
                 self.schedule_yik_index.append(i)
@@ -0,0 +1,121 @@
+from scheduler_v2 import SchedulerV2
+import pyscipopt
+import numpy as np
+
+class SchedulerSCIP(SchedulerV2):
+    def __init__(self, now, horizon, slice_size,
+                 resources, proposals, requests, verbose=1,
+                 timelimit=0, scheduler_type=None, threads=1, concurrent=False,
+                 mip_rel_gap=None, **kwargs):
+
+        super().__init__(now, horizon, slice_size, resources, proposals,
+            requests, verbose, timelimit, scheduler_type, **kwargs)
+
+        self.threads = threads         # Threads for concurrent solving
+        self.concurrent = concurrent   # Race differently configured SCIP solvers against each other
+        self.mip_rel_gap = mip_rel_gap # Relative gap to stop at, or SCIP's default if None
+
+
+    def check_scheduler_type(self):
+        if self.scheduler_type != "scip_native":
+            print("ERROR: Mismatched scheduler_type. '{}' should be 'scip_native'.".format(self.scheduler_type))
+
+
+    def solver_params(self):
+        return {"threads": self.threads, "concurrent": self.concurrent, "mip_rel_gap": self.mip_rel_gap}
+
+
+    def component_args(self, request_ids):
+        # Sub-schedulers (e.g. the components of run_decomposed) keep these settings
+        args = super().component_args(request_ids)
+        args.update(self.solver_params())
+        return args
+
+
+    def build_model(self):
+        pm = self.packing_model()
+
+        m = pyscipopt.Model("test_schedule")
+        if self.verbose_level < 2:
+            m.hideOutput()
+
+        # One isScheduled binary variable per possible start, with its objective coefficient
+        lower = pm.col_lower.tolist()
+        upper = pm.col_upper.tolist()
+        objective = pm.objective.tolist()
+        scheduled_vars = [m.addVar(name="isSched_{}".format(i), vtype="B",
+                                   lb=lower[i], ub=upper[i], obj=objective[i])
+                          for i in range(pm.num_col)]
+
+        # Constraint 4: Each request only scheduled once, then
+        # Constraint 3: Each timeslice should only have one request in it
+        # Each row is added straight from the incidence data as a knapsack with unit
+        # weights, which SCIP's presolve turns into a set packing constraint.
+        upper = pm.row_upper.astype(np.int64).tolist()
+        for k, cols in enumerate(pm.rows()):
+            m.addConsKnapsack([scheduled_vars[i] for i in cols], [1] * len(cols), upper[k],
+                              name=pm.row_name(k))
+
+        m.setMaximize()
+
+        self.scheduled_vars = scheduled_vars
+        self.model = m
+        self.log("Model constructed", 1)
+
+
+    def apply_warm_start(self, rows):
+        m = self.model
+        solution = m.createSol()
+        chosen = set(rows.tolist())
+        for i, var in enumerate(self.scheduled_vars):
+            m.setSolVal(solution, var, 1 if i in chosen else 0)
+        m.addSol(solution, free=True)
+
+
+    def solve_model(self):
+        m = self.model
+        if self.timelimit > 0:
+            m.setParam("limits/time", self.timelimit)
+        if self.mip_rel_gap is not None:
+            m.setParam("limits/gap", self.mip_rel_gap)
+
+        if self.concurrent:
+            # Falls back to a sequential solve if SCIP was built without parallel support
+            m.setParam("parallel/maxnthreads", self.threads)
+            m.solveConcurrent()
+        else:
+            m.optimize()
+
+        status = m.getStatus()
+        if status == "optimal":
+            self.scheduler_status = 1
+            self.log("Model optimized", 1)
+        elif m.getNSols() > 0:
+            # Stopped at a limit or by an interrupt, so keep the best incumbent
+            self.scheduler_status = 2
+            self.log("Model stopped with an incumbent: {}".format(status), 1)
+        else:
+            print("Model Status not optimal:", status)
+            return
+        bound = m.getDualbound()
+        self.bound = None if m.isInfinity(abs(bound)) else bound
+
+
+    def interpret_model(self):
+        m = self.model
+        solution = m.getBestSol()
+        self.objective_value = m.getSolObjVal(solution)
+        values = np.array([m.getSolVal(solution, var) for var in self.scheduled_vars])
+        self.schedule_yik_index = np.flatnonzero(values > 0.5)
+
+
+    def write_model(self, filename="test_model.mps"):
+        self.model.writeProblem(filename)
+        self.log(f"Model written to file: {filename}", 1)
+
+
+    def load_model(self, filename="test_model.mps"):
+        self.model = pyscipopt.Model()
+        if self.verbose_level < 2:
+            self.model.hideOutput()
+        self.model.readProblem(filename)
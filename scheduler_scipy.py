@@ -0,0 +1,94 @@
+from scheduler_v2 import SchedulerV2
+from scipy.optimize import milp, Bounds, LinearConstraint
+import numpy as np
+
+class SchedulerScipy(SchedulerV2):
+    def __init__(self, now, horizon, slice_size,
+                 resources, proposals, requests, verbose=1,
+                 timelimit=0, scheduler_type=None, mip_rel_gap=None, **kwargs):
+
+        super().__init__(now, horizon, slice_size, resources, proposals,
+            requests, verbose, timelimit, scheduler_type, **kwargs)
+
+        self.mip_rel_gap = mip_rel_gap # Relative gap to stop at, or HiGHS' default if None
+
+
+    def check_scheduler_type(self):
+        if self.scheduler_type != "scipy":
+            print("ERROR: Mismatched scheduler_type. '{}' should be 'scipy'.".format(self.scheduler_type))
+
+
+    def solver_params(self):
+        return {"mip_rel_gap": self.mip_rel_gap}
+
+
+    def component_args(self, request_ids):
+        # Sub-schedulers (e.g. the components of run_decomposed) keep these settings
+        args = super().component_args(request_ids)
+        args.update(self.solver_params())
+        return args
+
+
+    def build_model(self):
+        # milp takes the sparse matrix as it is, so building is just assembling it
+        pm = self.packing_model()
+        self.c = -pm.objective # milp minimises
+        self.integrality = np.ones(pm.num_col)
+        self.bounds = Bounds(pm.col_lower, pm.col_upper)
+        self.constraints = LinearConstraint(pm.A, pm.row_lower, pm.row_upper)
+        self.log("Model constructed", 1)
+
+
+    def apply_warm_start(self, rows):
+        # milp does not accept a starting solution
+        return
+
+
+    def solve_model(self):
+        options = {"disp": self.verbose_level >= 2}
+        if self.timelimit > 0:
+            options["time_limit"] = self.timelimit
+        if self.mip_rel_gap is not None:
+            options["mip_rel_gap"] = self.mip_rel_gap
+
+        if len(self.c) == 0:
+            # milp rejects a model without variables, and the empty schedule is optimal
+            self.result = None
+            self.scheduler_status = 1
+            self.bound = 0.0
+            self.log("Model empty", 1)
+            return
+
+        self.result = milp(self.c, integrality=self.integrality, bounds=self.bounds,
+                           constraints=self.constraints, options=options)
+
+        if self.result.status == 0:
+            self.scheduler_status = 1
+            self.log("Model optimized", 1)
+        elif self.result.x is not None:
+            # Stopped at the time limit with an incumbent
+            self.scheduler_status = 2
+            self.log("Model stopped with an incumbent: {}".format(self.result.message), 1)
+        else:
+            print("Model Status not optimal:", self.result.message)
+            return
+
+        if self.result.mip_dual_bound is not None:
+            self.bound = -self.result.mip_dual_bound
+
+
+    def interpret_model(self):
+        if self.result is None:
+            self.schedule_yik_index = np.zeros(0, dtype=np.int64)
+            self.objective_value = 0.0
+            return
+        self.schedule_yik_index = np.flatnonzero(self.result.x > 0.5)
+        self.objective_value = -self.result.fun
+
+
+    def write_model(self, filename="test_model.mps"):
+        print("Write_Model Failed: scipy's milp cannot save models to .MPS format.")
+
+
+    def load_model(self, filename="test_model.mps"):
+        print("Load_Model Failed: scipy's milp cannot load .MPS models.")
@@ -1,24 +1,388 @@
-class PossibleStart(object):
-    def __init__(self, resource, slice_starts, internal_start, slice_size):
-        self.resource = resource
-        self.first_slice_start = slice_starts[0]
-        self.all_slice_starts = slice_starts
-        self.internal_start = internal_start
-        self.slice_size = slice_size
-
-    def __lt__(self, other):
-        return self.first_slice_start < other.first_slice_start
-
-    def __eq__(self, other):
-        return self.first_slice_start == self.first_slice_start
-
-    def __gt__(self, other):
-        return self.first_slice_start > self.first_slice_start
-
-    def __str__(self):
-        return "resource_{}_start_{}_length_{}".format(self.resource,
-                                                       self.first_slice_start,
-                                                       self.slice_size)
+from scipy.sparse import csr_matrix
+import numpy as np
+import time
+
+
+class PossibleStartTable(object):
+    # Struct-of-arrays store of every possible start, one row per start.
+    # Rows are grouped by request, and sorted by first slice within each request.
+    def __init__(self, request_idx, resource_idx, window_idx, first_slice,
+                 n_slices, internal_start, priority, request_ids, resources):
+        self.request_idx = request_idx         # Index into request_ids
+        self.resource_idx = resource_idx       # Index into resources
+        self.window_idx = window_idx           # Position of the start within its request
+        self.first_slice = first_slice         # Index of the first occupied slice (start // slice_size)
+        self.n_slices = n_slices               # Number of slices occupied
+        self.internal_start = internal_start   # Actual start time of the observation
+        self.priority = priority               # Effective priority of the request
+        self.request_ids = request_ids
+        self.resources = resources
+
+    def __len__(self):
+        return len(self.request_idx)
+
+    def objective(self):
+        # Objective coefficient of each start, slightly favouring earlier starts
+        return self.priority + 0.1/(self.window_idx + 1.0)
+
+    def take(self, rows):
+        return PossibleStartTable(self.request_idx[rows], self.resource_idx[rows],
+                                  self.window_idx[rows], self.first_slice[rows],
+                                  self.n_slices[rows], self.internal_start[rows],
+                                  self.priority[rows], self.request_ids, self.resources)
+
+    def compact_requests(self):
+        # The same rows, with request_ids cut down to the requests that have a possible start
+        used, request_idx = np.unique(self.request_idx, return_inverse=True)
+        return PossibleStartTable(request_idx, self.resource_idx, self.window_idx,
+                                  self.first_slice, self.n_slices, self.internal_start,
+                                  self.priority, [self.request_ids[i] for i in used], self.resources)
+
+
+class IncidenceIndex(object):
+    # Compressed sparse row (CSR) incidence of constraint rows against possible
+    # starts: row k holds the possible starts indices[indptr[k]:indptr[k+1]].
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def __iter__(self):
+        # Python lists of the possible starts in each row
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        for k in range(len(self)):
+            yield indices[indptr[k]:indptr[k+1]]
+
+    def row(self, k):
+        return self.indices[self.indptr[k]:self.indptr[k+1]]
+
+    def take_csr(self, keep):
+        # indptr and indices of only the rows where 'keep' is True
+        row_lengths = np.diff(self.indptr)
+        indices = self.indices[np.repeat(keep, row_lengths)]
+        indptr = np.concatenate([[0], np.cumsum(row_lengths[keep])])
+        return indptr, indices
+
+
+class RequestIndex(IncidenceIndex):
+    # Groups the possible starts by request: row k holds every start of request_ids[k].
+    def __init__(self, indptr, indices, request_idx, request_ids):
+        super().__init__(indptr, indices)
+        self.request_idx = request_idx
+        self.request_ids = request_ids
+
+    @classmethod
+    def from_table(cls, yik):
+        counts = np.bincount(yik.request_idx, minlength=len(yik.request_ids))
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        indices = np.argsort(yik.request_idx, kind="stable")
+        return cls(indptr, indices, np.arange(len(yik.request_ids)), yik.request_ids)
+
+    def take_rows(self, keep):
+        indptr, indices = self.take_csr(keep)
+        return RequestIndex(indptr, indices, self.request_idx[keep], self.request_ids)
+
+    def row_name(self, k):
+        return self.request_ids[self.request_idx[k]]
+
+
+class SliceConflictIndex(IncidenceIndex):
+    # Row k holds every possible start that occupies one (resource, slice) pair.
+    def __init__(self, indptr, indices, resource_idx, slice_idx, resources):
+        super().__init__(indptr, indices)
+        self.resource_idx = resource_idx
+        self.slice_idx = slice_idx
+        self.resources = resources
+
+    @classmethod
+    def from_table(cls, yik):
+        n_slices = yik.n_slices
+        starts = np.repeat(np.arange(len(yik)), n_slices)
+        offsets = np.repeat(np.cumsum(n_slices) - n_slices, n_slices)
+        slices = yik.first_slice[starts] + np.arange(len(starts)) - offsets
+        resources = yik.resource_idx[starts]
+
+        order = np.lexsort((starts, slices, resources))
+        starts = starts[order]
+        slices = slices[order]
+        resources = resources[order]
+
+        new_row = np.ones(len(starts), dtype=bool)
+        new_row[1:] = (slices[1:] != slices[:-1]) | (resources[1:] != resources[:-1])
+        row_starts = np.flatnonzero(new_row)
+        indptr = np.append(row_starts, len(starts))
+
+        return cls(indptr, starts, resources[row_starts], slices[row_starts], yik.resources)
+
+    def take_rows(self, keep):
+        indptr, indices = self.take_csr(keep)
+        return SliceConflictIndex(indptr, indices, self.resource_idx[keep],
+                                  self.slice_idx[keep], self.resources)
+
+    def row_name(self, k):
+        return "resource_{}_slice_{}".format(self.resources[self.resource_idx[k]],
+                                             self.slice_idx[k])
+
+
+class PackingModel(object):
+    # Solver-independent form of the scheduling model, for each backend to load in bulk:
+    # maximise objective @ x subject to row_lower <= A @ x <= row_upper, with x binary.
+    # A holds one row per request in request_index, followed by one row per slice.
+    # Every row is a packing row, so row_lower is -inf throughout, and backends that
+    # take a single sense per row use row_upper alone.
+    def __init__(self, objective, A, row_lower, row_upper, request_index, slice_index):
+        self.objective = objective
+        self.A = A
+        self.row_lower = row_lower
+        self.row_upper = row_upper
+        self.col_lower = np.zeros(A.shape[1])
+        self.col_upper = np.ones(A.shape[1])
+        self.request_index = request_index
+        self.slice_index = slice_index
+        self.n_request_rows = len(request_index)
+
+    @classmethod
+    def from_indices(cls, yik, request_index, slice_index):
+        indptr = np.concatenate([request_index.indptr,
+                                 slice_index.indptr[1:] + request_index.indptr[-1]])
+        indices = np.concatenate([request_index.indices, slice_index.indices])
+        A = csr_matrix((np.ones(len(indices)), indices, indptr), shape=(len(indptr)-1, len(yik)))
+        return cls(yik.objective(), A, np.full(A.shape[0], -np.inf), np.ones(A.shape[0]),
+                   request_index, slice_index)
+
+    @property
+    def num_col(self):
+        return self.A.shape[1]
+
+    @property
+    def num_row(self):
+        return self.A.shape[0]
+
+    @property
+    def request_rows(self):
+        return self.A[:self.n_request_rows]
+
+    @property
+    def slice_rows(self):
+        return self.A[self.n_request_rows:]
+
+    def rows(self):
+        # Python lists of the columns in each row, for backends without a matrix interface
+        indptr = self.A.indptr.tolist()
+        indices = self.A.indices.tolist()
+        for k in range(self.num_row):
+            yield indices[indptr[k]:indptr[k+1]]
+
+    def row_name(self, k):
+        if k < self.n_request_rows:
+            return "one_per_reqid_constraint_{}".format(self.request_index.row_name(k))
+        return "one_per_slice_constraint_{}".format(self.slice_index.row_name(k - self.n_request_rows))
+
+    def col_name(self, i):
+        return "BIN_{}".format(i)
+
+
+def exact_packing(yik):
+    # Best set of non-conflicting possible starts, by exhaustive branch and bound.
+    # Only meant for small tables: the search is exponential in the number of starts.
+    n = len(yik)
+    objective = yik.objective().tolist()
+    request = yik.request_idx.tolist()
+    resource = yik.resource_idx.tolist()
+    first = yik.first_slice.tolist()
+    last = (yik.first_slice + yik.n_slices).tolist()
+
+    order = sorted(range(n), key=lambda i: -objective[i])
+    conflicts = [0] * n
+    for a in range(n):
+        for b in range(n):
+            i, j = order[a], order[b]
+            if a != b and (request[i] == request[j]
+                           or (resource[i] == resource[j] and first[i] < last[j] and first[j] < last[i])):
+                conflicts[a] |= 1 << b
+
+    # remaining[a] bounds the value still available from position a onwards
+    remaining = [0.0] * (n + 1)
+    for a in range(n - 1, -1, -1):
+        remaining[a] = remaining[a + 1] + objective[order[a]]
+
+    best = [0.0, 0]
+    def search(a, blocked, value, chosen):
+        if value > best[0]:
+            best[0], best[1] = value, chosen
+        if a == n or value + remaining[a] <= best[0]:
+            return
+        if not blocked >> a & 1:
+            search(a + 1, blocked | conflicts[a], value + objective[order[a]], chosen | 1 << a)
+        search(a + 1, blocked, value, chosen)
+    search(0, 0, 0.0, 0)
+
+    return sorted(order[a] for a in range(n) if best[1] >> a & 1)
+
+
+class FenwickTree(object):
+    # Prefix sums over a fixed range of positions, each add and sum in O(log n)
+    def __init__(self, size):
+        self.tree = [0] * (size + 1)
+
+    def add(self, position, value=1):
+        position += 1
+        while position < len(self.tree):
+            self.tree[position] += value
+            position += position & -position
+
+    def prefix_sum(self, end):
+        # Sum over positions [0, end)
+        total = 0
+        while end > 0:
+            total += self.tree[end]
+            end -= end & -end
+        return total
+
+
+def greedy_dispatch(yik, fixed=()):
+    # Place requests in priority order, each at its earliest possible start that
+    # is still free. Busy slice ranges never overlap, so the number meeting the range
+    # [first, last) is the number beginning before last, less the number ending at or
+    # before first. Each resource counts range beginnings and ends in Fenwick trees,
+    # so each start is checked and placed in O(log slices).
+    # The starts in 'fixed' (which must not conflict) are placed before any others.
+    request_idx = yik.request_idx.tolist()
+    resource_idx = yik.resource_idx.tolist()
+    first = yik.first_slice.tolist()
+    last = (yik.first_slice + yik.n_slices).tolist()
+    n_slices = max(last, default=0) + 1
+
+    # Rows are grouped by request, and in first slice order within each request
+    bounds = np.flatnonzero(np.diff(yik.request_idx, prepend=-1, append=-1)).tolist()
+    groups = [(bounds[g], bounds[g+1]) for g in range(len(bounds) - 1)]
+    groups.sort(key=lambda g: (-yik.priority[g[0]], request_idx[g[0]]))
+
+    busy_starts = [FenwickTree(n_slices) for _ in yik.resources]
+    busy_ends = [FenwickTree(n_slices) for _ in yik.resources]
+    scheduled = []
+    fixed_requests = set()
+    for i in fixed:
+        busy_starts[resource_idx[i]].add(first[i])
+        busy_ends[resource_idx[i]].add(last[i])
+        fixed_requests.add(request_idx[i])
+        scheduled.append(i)
+
+    for lo, hi in groups:
+        if request_idx[lo] in fixed_requests:
+            continue
+        for i in range(lo, hi):
+            starts = busy_starts[resource_idx[i]]
+            ends = busy_ends[resource_idx[i]]
+            if starts.prefix_sum(last[i]) - ends.prefix_sum(first[i] + 1) > 0:
+                continue
+            starts.add(first[i])
+            ends.add(last[i])
+            scheduled.append(i)
+            break
+
+    return sorted(scheduled)
+
+
+class LagrangianRelaxation(object):
+    # Relaxing the one-start-per-request constraints, with a multiplier per request,
+    # splits the problem into weighted interval scheduling on each resource, which
+    # is solved exactly by dynamic programming. Subgradient steps on the multipliers
+    # tighten the resulting upper bound, and each relaxed solution is repaired into
+    # a feasible schedule (keeping the best start of each request, then filling
+    # gaps by greedy dispatch) to give a lower bound.
+    def __init__(self, yik):
+        self.yik = yik
+        self.objective = yik.objective()
+        self.multipliers = np.zeros(len(yik.request_ids))
+        self.bound = None
+        self.best_value = 0.0
+        self.best_rows = np.zeros(0, dtype=np.int64)
+        self.iterations = 0
+
+        # Per resource: starts ordered by end, and how many of them end before each one begins
+        ends = yik.first_slice + yik.n_slices
+        self.resource_rows = []
+        self.resource_previous = []
+        for k in range(len(yik.resources)):
+            rows = np.flatnonzero(yik.resource_idx == k)
+            rows = rows[np.argsort(ends[rows], kind="stable")]
+            previous = np.searchsorted(ends[rows], yik.first_slice[rows], side="right")
+            self.resource_rows.append(rows)
+            self.resource_previous.append(previous.tolist())
+
+    def solve_relaxation(self, multipliers):
+        # Value of the relaxed problem, and the starts chosen on every resource
+        weights = (self.objective - multipliers[self.yik.request_idx]).tolist()
+        value = float(multipliers.sum())
+        chosen = []
+        for rows, previous in zip(self.resource_rows, self.resource_previous):
+            rows = rows.tolist()
+            best = [0.0] * (len(rows) + 1)
+            for j, i in enumerate(rows):
+                take = weights[i] + best[previous[j]]
+                best[j+1] = take if take > best[j] else best[j]
+
+            # Trace back the chosen starts
+            j = len(rows)
+            while j > 0:
+                if best[j] == best[j-1]:
+                    j -= 1
+                else:
+                    chosen.append(rows[j-1])
+                    j = previous[j-1]
+            value += best[-1]
+        return value, np.array(sorted(chosen), dtype=np.int64)
+
+    def repair(self, rows):
+        # Keep the best start of each request, which leaves no conflicts, then dispatch the rest
+        request_idx = self.yik.request_idx[rows]
+        order = np.lexsort((-self.objective[rows], request_idx))
+        first_of_request = np.diff(request_idx[order], prepend=-1) != 0
+        kept = rows[order[first_of_request]]
+        return np.array(greedy_dispatch(self.yik, fixed=kept.tolist()), dtype=np.int64)
+
+    def run(self, max_iterations=200, timelimit=0, step_scale=2.0, tolerance=1e-4):
+        # Subgradient optimisation with Polyak steps towards the best feasible value
+        deadline = time.time() + timelimit if timelimit > 0 else None
+        yik = self.yik
+        n_requests = len(yik.request_ids)
+        stalled = 0
+
+        for iteration in range(1, max_iterations + 1):
+            self.iterations = iteration
+            value, rows = self.solve_relaxation(self.multipliers)
+            if self.bound is None or value < self.bound - 1e-9:
+                self.bound = value
+                stalled = 0
+            else:
+                stalled += 1
+                if stalled >= 10:
+                    step_scale /= 2
+                    stalled = 0
+
+            repaired = self.repair(rows)
+            repaired_value = float(self.objective[repaired].sum())
+            if repaired_value > self.best_value:
+                self.best_value = repaired_value
+                self.best_rows = repaired
+
+            # One start per request: the subgradient is 1 - (starts chosen for the request)
+            subgradient = 1 - np.bincount(yik.request_idx[rows], minlength=n_requests)
+            subgradient[(self.multipliers <= 0) & (subgradient > 0)] = 0
+            norm = float((subgradient**2).sum())
+            if norm == 0 or self.bound - self.best_value <= tolerance * max(abs(self.best_value), 1.0):
+                break
+            if deadline is not None and time.time() > deadline:
+                break
+
+            step = step_scale * (value - self.best_value) / norm
+            self.multipliers = np.maximum(self.multipliers - step * subgradient, 0)
+
+        return self.best_rows
 
 
 def trim_time_segments(segment_list, start_cap, end_cap):
@@ -1,16 +1,26 @@
 # from gurobipy import Model, GRB, tuplelist, quicksum
 # from gurobipy import read as gurobi_read_model
 # from gurobipy import Env as gpEnv
-from scheduler_utils import PossibleStart, overlap_time_segments, trim_time_segments
+from scheduler_utils import PossibleStartTable, RequestIndex, SliceConflictIndex, PackingModel, overlap_time_segments, trim_time_segments, exact_packing, greedy_dispatch, LagrangianRelaxation
+from scipy.sparse import bmat
+from scipy.sparse.csgraph import connected_components
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import random
-import math
 import time
 
 
 class SchedulerV2(object):
+    # Whether rerun() can update the model of a previous run in place
+    supports_incremental = False
+    # Whether the model is built from slice rows over every possible start. Schedulers
+    # that work from the starts directly, or build their own slice rows, skip them.
+    uses_slice_index = True
+
     def __init__(self, now, horizon, slice_size,
                  resources, proposals, requests, verbose=1, timelimit=0,
-                 scheduler_type=None):
+                 scheduler_type=None, persistent=False, warm_start=None, greedy_fallback=False,
+                 cache=None):
         self.now = now
         self.horizon = horizon
         self.slice_size = slice_size
@@ -20,6 +30,12 @@ class SchedulerV2(object):
         self.verbose_level = verbose
         self.timelimit = timelimit
         self.scheduler_type = scheduler_type
+        self.persistent = persistent
+        self.warm_start = warm_start # A previous scheduled_requests result to start from
+        self.greedy_fallback = greedy_fallback # Dispatch greedily if the solver finds no schedule
+        self.used_greedy_fallback = False
+        self.cache = cache # A SolveCache to reuse the results of identical runs
+        self.cache_hit = False
 
         self.check_scheduler_type()
 
@@ -33,7 +49,14 @@ class SchedulerV2(object):
         self.objective_value = None
         self.scheduled_yik_index = None
         self.scheduled_requests = None
+        # 1 if the schedule is proven optimal, 2 if it is a feasible schedule
+        # (e.g. the best incumbent at the time limit), otherwise not solved
         self.scheduler_status = None
+        self.bound = None # Upper bound on the objective, where known
+        self.gap = None   # Relative gap between objective_value and bound
+        self.presolve_stats = {}
+        self.component_stats = {}
+        self.rolling_stats = {}
 
     
     def check_scheduler_type(self):
@@ -59,40 +82,46 @@ class SchedulerV2(object):
             r["free_windows_dict"] = fwd
 
 
-    def get_slices(self, intervals, resource, duration):
+    def get_slices(self, windows):
+        # Expand free windows into possible starts. 'windows' holds one row per
+        # free window: start, end and the duration of the request it belongs to.
+        # Returns, per start: the window row it came from, the index of its first
+        # slice, its internal (actual) start time and the number of slices occupied.
         slice_size = self.slice_size
-        slices = []
-        internal_starts = []
-        for t in intervals: 
-            start = int(math.floor(float(t["start"])/float(slice_size))*slice_size) # Start of the time_slice that this starts in
-            internal_start = t["start"]                                             # Actual start of this observation window
-            end_time = internal_start + duration                                    # End of this observation window
-
-            while (t["end"] - start) >= duration:
-                # Generate a range of slices that will be occupied for this start and duration
-                # WARNING - HAVE TO GO BACK THROUGH REQUEST GENERATION AND MAKE SURE THESE ARE ALL INTS
-                tmp = list(range(start, internal_start+duration, slice_size))
-                slices.append(tmp)
-                internal_starts.append(internal_start)
-                start += slice_size                                # Moving on to the next potential start, so move the Start up to the next slice
-                internal_start = start                             # As only the first potential start in a window will be internal, make the 
-                                                                   # next Internal Start an external start
-        # return slices, internal_starts
-        ps_list = []
-        idx = 0
-        for w in slices:
-            ps_list.append(PossibleStart(resource, w, internal_starts[idx], slice_size))
-            idx += 1
-
-        return ps_list
+        w_start, w_end, w_duration = windows
+
+        # Only the first start in a window is internal, the rest begin on a slice boundary
+        w_first_slice = np.floor(w_start / slice_size).astype(np.int64)
+        w_slack = w_end - w_first_slice*slice_size - w_duration
+        w_counts = np.where(w_slack >= 0, w_slack // slice_size + 1, 0).astype(np.int64)
+
+        window_rows = np.repeat(np.arange(len(w_counts)), w_counts)
+        offsets = np.repeat(np.cumsum(w_counts) - w_counts, w_counts)
+        k = np.arange(len(window_rows)) - offsets
+
+        first_slice = w_first_slice[window_rows] + k
+        internal_start = np.where(k == 0, w_start[window_rows], first_slice*slice_size)
+        end_time = internal_start + w_duration[window_rows]
+        n_slices = (-((first_slice*slice_size - end_time) // slice_size)).astype(np.int64)
+
+        return window_rows, first_slice, internal_start, n_slices
 
 
     def build_data_structures(self):
-        yik = []
-        aikt = {}
+        request_ids = list(self.requests.keys())
+        resources = list(self.resources.keys())
+        resource_index = {res: k for k, res in enumerate(resources)}
+        effective_priorities = []
 
-        for i, r in self.requests.items():
-            yik_entries = []
+        # Gather every free window as flat arrays
+        w_request = []
+        w_resource = []
+        w_start = []
+        w_end = []
+        w_duration = []
+
+        for idx, i in enumerate(request_ids):
+            r = self.requests[i]
 
             # Calculate request_priority from proposal_priority
             request_proposal = self.proposals[r["proposal"]]
@@ -105,32 +134,163 @@ class SchedulerV2(object):
             effective_priority = tac_priority * r["duration"] / 60.0 
             effective_priority = min(effective_priority, 32000.0)*ran
             self.requests[i]["effective_priority"] = effective_priority
-
-            # Determine possible_starts, and sort
-            possible_starts = []
-            for resource in r["free_windows_dict"].keys():
-                possible_starts.extend(self.get_slices(r["free_windows_dict"][resource], resource, r["duration"]))
-            possible_starts.sort()
-            self.requests[i]["possible_starts"] = possible_starts
-        
-            # Create Yik Entry for request
-            w_idx = 0
-            for ps in possible_starts:
-                yik_idx = len(yik)
-                yik_entries.append(yik_idx)
-                scheduled = 0 # Option to set to 1 for a Warm Start would go here
-                yik.append([r["resID"], w_idx, effective_priority, ps.resource, scheduled, ps])
-                w_idx += 1
-        
-                # Create aikt entry for each possible start
-                for s in ps.all_slice_starts:
-                    slice_hash = f"resource_{ps.resource}_start_{repr(s)}_length_{repr(self.slice_size)}"
-                    if slice_hash not in aikt:
-                        aikt[slice_hash] = []
-                    aikt[slice_hash].append(yik_idx)
-                    
-        self.yik = yik
-        self.aikt = aikt
+            effective_priorities.append(effective_priority)
+
+            for resource, windows in r["free_windows_dict"].items():
+                if resource not in resource_index:
+                    resource_index[resource] = len(resources)
+                    resources.append(resource)
+                for w in windows:
+                    w_request.append(idx)
+                    w_resource.append(resource_index[resource])
+                    w_start.append(w["start"])
+                    w_end.append(w["end"])
+                    w_duration.append(r["duration"])
+
+        w_request = np.array(w_request, dtype=np.int64)
+        w_resource = np.array(w_resource, dtype=np.int64)
+        windows = (np.array(w_start), np.array(w_end), np.array(w_duration))
+        window_rows, first_slice, internal_start, n_slices = self.get_slices(windows)
+        request_idx = w_request[window_rows]
+
+        # Sort possible starts by first slice within each request (stable, as before)
+        order = np.lexsort((first_slice, request_idx))
+        request_idx = request_idx[order]
+        group_start = np.searchsorted(request_idx, request_idx)
+        window_idx = np.arange(len(request_idx)) - group_start
+
+        self.yik = PossibleStartTable(request_idx,
+                                      w_resource[window_rows][order],
+                                      window_idx,
+                                      first_slice[order],
+                                      n_slices[order],
+                                      internal_start[order],
+                                      np.array(effective_priorities, dtype=float)[request_idx],
+                                      request_ids,
+                                      resources)
+
+        self.build_indices()
+
+
+    def build_indices(self):
+        # Index the possible starts of each request, and occupying each slice of each resource
+        self.request_index = RequestIndex.from_table(self.yik)
+        self.aikt = SliceConflictIndex.from_table(self.yik) if self.uses_slice_index else None
+
+
+    def presolve(self):
+        # Reduce the data structures before any model is built
+        self.drop_dominated_starts()
+        self.drop_unschedulable_requests()
+        if self.uses_slice_index and not (self.persistent and self.supports_incremental):
+            # A persistent model adds new starts to existing slice rows, so keeps one row per slice
+            self.reduce_slice_constraints()
+
+
+    def drop_unschedulable_requests(self):
+        # Requests without any possible start would only add empty constraints.
+        # Count those whose windows all lie outside now -> horizon separately from
+        # those whose free windows are too short for their duration.
+        request_index = self.request_index
+        has_starts = np.diff(request_index.indptr) > 0
+
+        outside = 0
+        for k in np.flatnonzero(~has_starts):
+            r = self.requests[request_index.row_name(k)]
+            windows = [w for ws in r["windows"].values() for w in ws]
+            # A request with no windows at all is unschedulable, not outside the horizon
+            if windows and all(w["end"] <= self.now or w["start"] >= self.horizon for w in windows):
+                outside += 1
+
+        self.request_index = request_index.take_rows(has_starts)
+        self.presolve_stats["requests_outside_horizon"] = outside
+        self.presolve_stats["requests_unschedulable"] = int(len(has_starts) - has_starts.sum()) - outside
+        self.log("Presolve dropped {} requests outside the horizon and {} unschedulable requests".format(
+            outside, self.presolve_stats["requests_unschedulable"]), 1)
+
+
+    def drop_dominated_starts(self):
+        # A start is dominated by another start of the same request on the same
+        # resource that occupies a subset of its slices with an objective at least
+        # as good: any schedule using the first can use the second instead.
+        # All starts of a request share its duration, so their slice counts differ by
+        # at most one, and a contained start begins in the same or the next slice.
+        # A start in the next slice has a later window index, so a smaller earlier-start
+        # bonus: in practice only starts sharing a first slice are ever dominated.
+        yik = self.yik
+        objective = yik.objective()
+        stride = int(yik.first_slice.max(initial=0)) + 2
+
+        order = np.lexsort((yik.first_slice, yik.resource_idx, yik.request_idx))
+        group = yik.request_idx[order] * len(yik.resources) + yik.resource_idx[order]
+        key = group * stride + yik.first_slice[order]
+        lo = np.searchsorted(key, key, side="left")
+        hi = np.searchsorted(key, key + 1, side="right")
+
+        a = order
+        first_a = yik.first_slice[a]
+        last_a = first_a + yik.n_slices[a]
+        dominated = np.zeros(len(yik), dtype=bool)
+        for offset in range(int((hi - lo).max(initial=0))):
+            pos = lo + offset
+            valid = (pos < hi) & (pos != np.arange(len(order)))
+            b = order[np.where(valid, pos, 0)]
+            first_b = yik.first_slice[b]
+            last_b = first_b + yik.n_slices[b]
+            contained = (first_b >= first_a) & (last_b <= last_a)
+            identical = (first_b == first_a) & (last_b == last_a)
+            better = ((objective[b] > objective[a])
+                      | ((objective[b] == objective[a]) & (~identical | (b < a))))
+            dominated[a[valid & contained & better]] = True
+
+        if dominated.any():
+            self.yik = yik.take(~dominated)
+            self.build_indices()
+        self.presolve_stats["starts_dominated"] = int(dominated.sum())
+        self.log("Presolve dropped {} dominated possible starts".format(
+            self.presolve_stats["starts_dominated"]), 1)
+
+
+    def reduce_slice_constraints(self):
+        # Every possible start covers a contiguous run of slices on one resource, so
+        # the starts covering a slice form a clique. A slice's clique is contained in
+        # the previous slice's unless some start begins at it, and in a later slice's
+        # unless some start ends before the next one begins. Only those rows are kept:
+        # the maximal, distinct cliques. Rows with a single start are already implied
+        # by the binary bounds.
+        yik = self.yik
+        aikt = self.aikt
+        stride = int(max(yik.first_slice.max(initial=0) + yik.n_slices.max(initial=0), 0)) + 1
+
+        row_keys = aikt.resource_idx * stride + aikt.slice_idx
+        first_keys = np.sort(yik.resource_idx * stride + yik.first_slice)
+        last_keys = np.sort(yik.resource_idx * stride + yik.first_slice + yik.n_slices - 1)
+
+        # First slice at or after each row where a start ends, and after it where one begins
+        next_end = np.append(last_keys, np.iinfo(np.int64).max)[np.searchsorted(last_keys, row_keys, side="left")]
+        next_begin = np.append(first_keys, np.iinfo(np.int64).max)[np.searchsorted(first_keys, row_keys, side="right")]
+
+        keep = (np.isin(row_keys, first_keys)
+                & (next_end < next_begin)
+                & (np.diff(aikt.indptr) > 1))
+
+        self.aikt = aikt.take_rows(keep)
+        self.presolve_stats["slice_rows_removed"] = int(len(keep) - keep.sum())
+        self.log("Presolve removed {} of {} slice constraints".format(
+            self.presolve_stats["slice_rows_removed"], len(keep)), 1)
+
+
+    def packing_model(self):
+        # The model in solver-independent form, for a backend to load in bulk
+        return PackingModel.from_indices(self.yik, self.request_index, self.aikt)
+
+
+    def column_keys(self):
+        # Key identifying each possible start across runs: (request, resource, first slice, start)
+        yik = self.yik
+        request_ids = [yik.request_ids[i] for i in yik.request_idx.tolist()]
+        resources = [yik.resources[k] for k in yik.resource_idx.tolist()]
+        return list(zip(request_ids, resources, yik.first_slice.tolist(), yik.internal_start.tolist()))
 
 
     def time_build_model(self):
@@ -155,6 +315,50 @@ class SchedulerV2(object):
         return
 
 
+    def index_model(self):
+        # Record the model's variables and rows by key, so rerun() can update them
+        print("Scheduler_v2 is just a template. This function should be overwritten.")
+        return
+
+
+    def update_model(self, keys, added_rows, removed_keys, disabled_keys):
+        print("Scheduler_v2 is just a template. This function should be overwritten.")
+        return
+
+
+    def warm_start_rows(self):
+        # Rows of the possible starts that reproduce the warm start schedule. Starts
+        # that are no longer possible (e.g. already begun, or on a closed resource) are skipped.
+        yik = self.yik
+        lookup = {}
+        for row, (i, k, start) in enumerate(zip(yik.request_idx.tolist(), yik.resource_idx.tolist(),
+                                                yik.internal_start.tolist())):
+            rid = self.requests[yik.request_ids[i]]["resID"]
+            lookup[(str(rid), yik.resources[k], start)] = row
+
+        rows = []
+        for s in self.warm_start["scheduled"].values():
+            row = lookup.get((str(s["rID"]), s["resource"], s["start"]))
+            if row is not None:
+                rows.append(row)
+        return np.array(sorted(rows), dtype=np.int64)
+
+
+    def set_warm_start(self):
+        if self.warm_start is None:
+            return
+        rows = self.warm_start_rows()
+        self.apply_warm_start(rows)
+        self.log("Warm start from {} of {} previously scheduled requests".format(
+            len(rows), len(self.warm_start["scheduled"])), 1)
+
+
+    def apply_warm_start(self, rows):
+        # Pass the possible starts in 'rows' to the solver as a starting solution
+        print("Scheduler_v2 is just a template. This function should be overwritten.")
+        return
+
+
     def time_solve_model(self):
         start_solve = time.time()
         self.solve_model()
@@ -167,9 +371,20 @@ class SchedulerV2(object):
         return
 
 
+    def has_schedule(self):
+        return self.scheduler_status in (1, 2)
+
+
+    def update_gap(self):
+        # Solvers stopped before their first bound report it as infinite
+        if self.bound is not None and np.isfinite(self.bound) and self.objective_value:
+            self.gap = max(self.bound - self.objective_value, 0) / abs(self.objective_value)
+
+
     def time_interpret_model(self):
         start_interpret = time.time()
         self.interpret_model()
+        self.update_gap()
         self.return_solution()
         end_interpret = time.time()
         self.interpret_time = end_interpret - start_interpret
@@ -181,16 +396,19 @@ class SchedulerV2(object):
 
 
     def return_solution(self):
+        yik = self.yik
+        rows = np.asarray(self.schedule_yik_index, dtype=np.int64)
+        request_ids = [yik.request_ids[i] for i in yik.request_idx[rows]]
+        resources = [yik.resources[k] for k in yik.resource_idx[rows]]
+        start_times = yik.internal_start[rows].tolist()
+
         scheduled = []
-        for i in self.schedule_yik_index:
-            entry = self.yik[i]
+        for i, resource, start_time in zip(request_ids, resources, start_times):
             # Get relevant parameters
-            rid = entry[0]
-            resource = entry[3]
-            start_time = entry[5].internal_start
-            duration = self.requests[str(rid)]["duration"]
+            rid = self.requests[i]["resID"]
+            duration = self.requests[i]["duration"]
             end_time = start_time + duration
-            priority = self.requests[str(rid)]["effective_priority"]
+            priority = self.requests[i]["effective_priority"]
 
             # Add for saving
             request_dict = {
@@ -215,21 +433,423 @@ class SchedulerV2(object):
 
 
     def run(self):
+        # A persistent scheduler has to build its model on the first run, to update later
+        if self.cache is None or (self.persistent and self.supports_incremental):
+            return self.solve()
+
+        key = self.cache_key()
+        cached = self.cache.get(key)
+        if cached is not None:
+            return self.load_cached_result(cached)
+        result = self.solve()
+        if result is not None:
+            self.cache.put(key, {"scheduled_requests": result,
+                                 "objective_value": self.objective_value,
+                                 "scheduler_status": self.scheduler_status,
+                                 "bound": self.bound,
+                                 "gap": self.gap,
+                                 "used_greedy_fallback": self.used_greedy_fallback})
+        return result
+
+
+    def solver_params(self):
+        # Settings, besides the instance itself, that the result of a run depends on
+        return {}
+
+
+    def cache_key(self):
+        params = {"timelimit": self.timelimit, "warm_start": self.warm_start,
+                  "greedy_fallback": self.greedy_fallback}
+        params.update(self.solver_params())
+        return self.cache.key(self.now, self.horizon, self.slice_size, self.resources,
+                              self.proposals, self.requests, self.scheduler_type, params)
+
+
+    def load_cached_result(self, cached):
+        self.cache_hit = True
+        self.scheduled_requests = cached["scheduled_requests"]
+        self.objective_value = cached["objective_value"]
+        self.scheduler_status = cached["scheduler_status"]
+        self.bound = cached["bound"]
+        self.gap = cached["gap"]
+        self.used_greedy_fallback = cached["used_greedy_fallback"]
+        self.build_time = 0.0
+        self.solve_time = 0.0
+        self.interpret_time = 0.0
+        self.log("Schedule loaded from the cache", 1)
+        return self.scheduled_requests
+
+
+    def solve(self):
+        self.calculate_free_windows()
+        self.build_data_structures()
+        self.presolve()
+        self.time_build_model()
+        if self.persistent and self.supports_incremental:
+            self.index_model()
+        self.set_warm_start()
+        self.time_solve_model()
+        if self.has_schedule():
+            self.time_interpret_model()
+            return self.return_solution()
+        if self.greedy_fallback:
+            return self.run_greedy_fallback()
+
+
+    def run_greedy_fallback(self):
+        # Schedule by greedy dispatch over the possible starts, when the solver has
+        # not returned a schedule (e.g. it ran out of time)
+        self.log("No schedule from the solver, falling back to greedy dispatch", 1)
+        self.schedule_yik_index = np.array(greedy_dispatch(self.yik), dtype=np.int64)
+        self.objective_value = float(self.yik.objective()[self.schedule_yik_index].sum())
+        self.used_greedy_fallback = True
+        self.scheduler_status = 2
+        self.update_gap()
+        return self.return_solution()
+
+
+    def rerun(self, now, resources, requests, warm_start=None):
+        # Persistent mode: re-solve for a new simulation state by updating the model
+        # kept from the previous run, rather than building a new one. Starts that no
+        # longer exist are removed, except those on a closed resource, which are only
+        # disabled in case it reopens. New starts are added to the existing model.
+        self.now = now
+        self.resources = resources
+        self.requests = requests
+        self.warm_start = warm_start
+        self.scheduler_status = None
+        self.bound = None
+        self.gap = None
+        self.used_greedy_fallback = False
+
+        self.calculate_free_windows()
+        self.build_data_structures()
+        self.presolve()
+
+        start_build = time.time()
+        keys = self.column_keys()
+        current = set(keys)
+        added_rows = [i for i, k in enumerate(keys) if k not in self.column_vars]
+        removed_keys = []
+        disabled_keys = []
+        for k in self.column_vars:
+            if k not in current:
+                if k[1] in self.resources:
+                    removed_keys.append(k)
+                else:
+                    disabled_keys.append(k)
+        self.update_model(keys, added_rows, removed_keys, disabled_keys)
+        self.build_time = time.time() - start_build
+        self.log("Model updated: {} starts added, {} removed, {} disabled".format(
+            len(added_rows), len(removed_keys), len(disabled_keys)), 1)
+
+        self.set_warm_start()
+        self.time_solve_model()
+        if self.has_schedule():
+            self.time_interpret_model()
+            return self.return_solution()
+        if self.greedy_fallback:
+            return self.run_greedy_fallback()
+
+
+    def run_coarse_to_fine(self, coarse_factor=4, refine_radius=1):
+        # Solve first on a grid of coarse_factor * slice_size, then re-solve at full
+        # resolution keeping, for each request scheduled on the coarse grid, only its
+        # starts on the same resource within refine_radius coarse slices of the coarse
+        # start. Requests left unscheduled keep only the starts that fit in the gaps of
+        # the coarse schedule, where each scheduled block may shrink by the same radius.
+        # The fine solve is warm-started from the coarse schedule.
         self.calculate_free_windows()
+        fine_slice_size = self.slice_size
+        coarse_slice_size = fine_slice_size * coarse_factor
+        radius = refine_radius * coarse_slice_size
+
+        self.slice_size = coarse_slice_size
+        self.build_data_structures()
+        self.presolve()
+        self.time_build_model()
+        self.time_solve_model()
+        coarse_build_time = self.build_time
+        coarse_solve_time = self.solve_time
+        coarse_starts = len(self.yik)
+
+        # Coarse placement of each request, by id, as the presolve may have compacted them
+        coarse = {}
+        if self.has_schedule():
+            self.interpret_model()
+            for row in self.schedule_yik_index:
+                rid = self.yik.request_ids[self.yik.request_idx[row]]
+                coarse[rid] = (self.yik.resource_idx[row], self.yik.internal_start[row])
+        self.scheduler_status = None
+
+        self.slice_size = fine_slice_size
         self.build_data_structures()
+        yik = self.yik
+        duration = np.array([self.requests[rid]["duration"] for rid in yik.request_ids])
+        coarse_resource = np.array([coarse.get(rid, (-1, 0))[0] for rid in yik.request_ids])
+        coarse_start = np.array([coarse.get(rid, (-1, 0))[1] for rid in yik.request_ids])
+
+        # A coarse start can run past the end of its window by up to a coarse slice, so
+        # requests whose coarse start is not also a fine start count as unscheduled
+        scheduled = coarse_resource[yik.request_idx]
+        offset = yik.internal_start - coarse_start[yik.request_idx]
+        exact = (yik.resource_idx == scheduled) & (offset == 0)
+        coarse_resource[~np.isin(np.arange(len(yik.request_ids)), yik.request_idx[exact])] = -1
+        scheduled = coarse_resource[yik.request_idx]
+        near = (yik.resource_idx == scheduled) & (np.abs(offset) <= radius)
+
+        # Each coarse block keeps its middle occupied however far it moves, so starts
+        # of unscheduled requests that overlap such a core are dropped
+        in_gap = scheduled == -1
+        begin = yik.internal_start
+        end = begin + duration[yik.request_idx]
+        for k in range(len(yik.resources)):
+            blocks = np.flatnonzero(coarse_resource == k)
+            core_begin = coarse_start[blocks] + radius
+            core_end = coarse_start[blocks] + duration[blocks] - radius
+            order = np.argsort(core_begin)
+            non_empty = (core_begin < core_end)[order]
+            core_begin = core_begin[order][non_empty]
+            core_end = core_end[order][non_empty]
+            if len(core_begin) == 0:
+                continue
+            # Cores do not overlap, so only the first core ending after a start can overlap it
+            rows = np.flatnonzero(in_gap & (yik.resource_idx == k))
+            nxt = np.searchsorted(core_end, begin[rows], side="right")
+            overlaps = (nxt < len(core_begin)) & (core_begin[np.minimum(nxt, len(core_begin) - 1)] < end[rows])
+            in_gap[rows[overlaps]] = False
+
+        keep = in_gap | near
+        self.yik = yik.take(keep)
+        self.build_indices()
+        self.presolve()
+
+        self.presolve_stats["coarse_starts"] = coarse_starts
+        self.presolve_stats["refined_starts_dropped"] = int(len(keep) - keep.sum())
+        self.log("Coarse-to-fine: {} coarse starts, {} of {} fine starts kept".format(
+            coarse_starts, int(keep.sum()), len(keep)), 1)
+
         self.time_build_model()
+        if self.warm_start is not None:
+            self.set_warm_start()
+        else:
+            # The coarse schedule is also a fine one, as coarse slices are whole fine slices
+            yik = self.yik
+            placement = [coarse.get(rid, (-1, 0)) for rid in yik.request_ids]
+            coarse_resource = np.array([p[0] for p in placement])[yik.request_idx]
+            coarse_start = np.array([p[1] for p in placement])[yik.request_idx]
+            self.apply_warm_start(np.flatnonzero((yik.resource_idx == coarse_resource)
+                                                 & (yik.internal_start == coarse_start)))
         self.time_solve_model()
-        if self.scheduler_status == 1:
+        self.build_time += coarse_build_time
+        self.solve_time += coarse_solve_time
+        if self.has_schedule():
+            # Only optimal over the refined starts, so neither the status nor the bound hold overall
+            self.scheduler_status = 2
+            self.bound = None
             self.time_interpret_model()
             return self.return_solution()
 
 
+    def find_components(self):
+        # Label each possible start with its connected component, where starts are
+        # connected if they share a request or a slice. Components share no
+        # constraints, so each can be solved as a separate model.
+        aikt = self.aikt if self.aikt is not None else SliceConflictIndex.from_table(self.yik)
+        A = PackingModel.from_indices(self.yik, self.request_index, aikt).A
+
+        # Bipartite graph of constraint rows and starts
+        n_components, labels = connected_components(bmat([[None, A], [A.T, None]]), directed=False)
+        _, labels = np.unique(labels[A.shape[0]:], return_inverse=True)
+        return labels
+
+
+    def component_args(self, request_ids):
+        # Arguments for a scheduler that solves only the given requests
+        return {"now": self.now, "horizon": self.horizon, "slice_size": self.slice_size,
+                "resources": self.resources, "proposals": self.proposals,
+                "requests": {i: self.requests[i] for i in request_ids},
+                "verbose": 0, "timelimit": self.timelimit,
+                "scheduler_type": self.scheduler_type, "warm_start": self.warm_start}
+
+
+    def solve_table(self, yik):
+        # Build and solve a model over the given possible starts only. Returns the
+        # status, scheduled rows of 'yik', upper bound, and build and solve times.
+        self.yik = yik
+        self.scheduler_status = None
+        self.bound = None
+        self.build_indices()
+        self.presolve()
+        self.time_build_model()
+        self.set_warm_start()
+        self.time_solve_model()
+        if not self.has_schedule():
+            return self.scheduler_status, None, None, self.build_time, self.solve_time
+        self.time_interpret_model()
+        return (self.scheduler_status, np.asarray(self.schedule_yik_index, dtype=np.int64),
+                self.bound, self.build_time, self.solve_time)
+
+
+    def run_decomposed(self, max_workers=None, exact_component_size=12):
+        # Split the possible starts into independent components (e.g. separate nights
+        # or telescope networks) and solve each one on its own, in a process pool.
+        # Components of at most exact_component_size starts are solved exactly here
+        # instead, which is faster than building a model for them.
+        self.calculate_free_windows()
+        self.build_data_structures()
+        self.presolve()
+
+        start_solve = time.time()
+        labels = self.find_components()
+        order = np.argsort(labels, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(labels))])
+        components = [order[bounds[k]:bounds[k+1]] for k in range(len(bounds) - 1)]
+        components.sort(key=len, reverse=True)
+
+        scheduled = []
+        build_time = 0.0
+        solved = True
+        status = 1
+        bound = 0.0
+        n_exact = 0
+        with ProcessPoolExecutor(max_workers) as pool:
+            futures = []
+            for rows in components:
+                table = self.yik.take(rows)
+                if len(rows) <= exact_component_size:
+                    chosen = rows[exact_packing(table)]
+                    scheduled.append(chosen)
+                    bound += float(self.yik.objective()[chosen].sum())
+                    n_exact += 1
+                else:
+                    table = table.compact_requests()
+                    futures.append((rows, pool.submit(solve_component, type(self),
+                                                      self.component_args(table.request_ids), table)))
+
+            for rows, future in futures:
+                sub_status, sub_rows, sub_bound, sub_build_time, sub_solve_time = future.result()
+                build_time += sub_build_time
+                if sub_status not in (1, 2):
+                    print(f"Component of {len(rows)} possible starts not solved: {sub_status}")
+                    solved = False
+                    continue
+                scheduled.append(rows[sub_rows])
+                status = max(status, sub_status)
+                bound = None if bound is None or sub_bound is None else bound + sub_bound
+
+        self.build_time = build_time
+        self.solve_time = time.time() - start_solve
+        self.component_stats = {"components": len(components),
+                                "exact_components": n_exact,
+                                "largest_component": len(components[0]) if components else 0}
+        self.log("Decomposed into {} components, {} solved exactly, largest has {} possible starts".format(
+            len(components), n_exact, self.component_stats["largest_component"]), 1)
+
+        if solved:
+            self.scheduler_status = status
+            self.bound = bound
+            self.schedule_yik_index = np.sort(np.concatenate(scheduled)) if scheduled else np.zeros(0, dtype=np.int64)
+            self.objective_value = float(self.yik.objective()[self.schedule_yik_index].sum())
+            self.update_gap()
+            return self.return_solution()
+
+
+    def run_rolling_horizon(self, block_length, overlap):
+        # Solve overlapping blocks of block_length seconds in time order, rather than
+        # one model for the whole horizon. A block holds the starts whose first slice
+        # lies in it, less those of committed requests or clashing with committed
+        # starts. Its solution is committed up to block_length - overlap, and the next
+        # block starts there. The last block commits everything it schedules.
+        if overlap < 0 or overlap >= block_length:
+            print("ERROR: Rolling horizon overlap must be at least 0 and less than the block length.")
+            return
+
+        self.calculate_free_windows()
+        self.build_data_structures()
+        self.presolve()
+
+        full = self.yik
+        slice_size = self.slice_size
+        start_time = full.first_slice * slice_size
+        end_time = full.first_slice.max(initial=0) * slice_size + slice_size
+        n_slices = int((full.first_slice + full.n_slices).max(initial=0))
+
+        committed = []
+        committed_request = np.zeros(len(full.request_ids), dtype=bool)
+        occupied = np.zeros((len(full.resources), n_slices + 1), dtype=np.int64)
+        build_time = 0.0
+        solve_time = 0.0
+        largest_block = 0
+        n_blocks = 0
+
+        block_start = (self.now // slice_size) * slice_size
+        while block_start < end_time:
+            block_end = block_start + block_length
+            last_block = block_end >= end_time
+
+            # Starts in this block that are still free to schedule
+            prefix = np.zeros((occupied.shape[0], occupied.shape[1] + 1), dtype=np.int64)
+            np.cumsum(occupied, axis=1, out=prefix[:, 1:])
+            clash = (prefix[full.resource_idx, full.first_slice + full.n_slices]
+                     - prefix[full.resource_idx, full.first_slice]) > 0
+            rows = np.flatnonzero((start_time >= block_start) & (start_time < block_end)
+                                  & ~committed_request[full.request_idx] & ~clash)
+
+            n_blocks += 1
+            largest_block = max(largest_block, len(rows))
+            if len(rows) > 0:
+                status, sub_rows, _, sub_build_time, sub_solve_time = self.solve_table(full.take(rows).compact_requests())
+                build_time += sub_build_time
+                solve_time += sub_solve_time
+                if status not in (1, 2):
+                    print(f"Rolling horizon block {block_start} - {block_end} not solved: {status}")
+                    self.yik = full
+                    return
+
+                chosen = rows[sub_rows]
+                if not last_block:
+                    chosen = chosen[start_time[chosen] < block_end - overlap]
+                committed.append(chosen)
+                committed_request[full.request_idx[chosen]] = True
+                for i in chosen.tolist():
+                    occupied[full.resource_idx[i], full.first_slice[i]:full.first_slice[i] + full.n_slices[i]] = 1
+
+            block_start = block_end - overlap
+
+        self.yik = full
+        self.build_indices()
+        self.build_time = build_time
+        self.solve_time = solve_time
+        self.interpret_time = 0.0
+        self.rolling_stats = {"blocks": n_blocks, "largest_block": largest_block}
+        self.log("Rolling horizon: {} blocks, largest has {} possible starts".format(n_blocks, largest_block), 1)
+
+        # Optimal within each block does not make the whole schedule optimal
+        self.scheduler_status = 2
+        self.bound = None
+        self.schedule_yik_index = np.sort(np.concatenate(committed)) if committed else np.zeros(0, dtype=np.int64)
+        self.objective_value = float(full.objective()[self.schedule_yik_index].sum())
+        return self.return_solution()
+
+
+    def lagrangian_gap(self, max_iterations=100):
+        # Bound the objective by Lagrangian relaxation, to report the optimality gap
+        # of a schedule from a heuristic backend. Call after the schedule is found.
+        relaxation = LagrangianRelaxation(self.yik)
+        relaxation.run(max_iterations)
+        self.bound = relaxation.bound
+        self.update_gap()
+        self.log("Lagrangian bound {}, gap {}".format(self.bound, self.gap), 1)
+        return self.gap
+
+
     def print_solution(self, scheduled):
         scheduled.sort(key=lambda x: x["start"])
         scheduled.sort(key=lambda x: x["resource"])
 
         print("---\nTotal Priority: {}\nScheduled Observations: {}".format(
-                                            self.model.ObjVal, len(scheduled)))
+                                            self.objective_value, len(scheduled)))
 
         for s in scheduled:
             print("RequestID: {}, "
@@ -253,3 +873,8 @@ class SchedulerV2(object):
         except TypeError:
             total_time = None
         return total_time
+
+
+def solve_component(Scheduler, scheduler_args, yik):
+    # Runs in a worker process: solves one component with a scheduler of its own
+    return Scheduler(**scheduler_args).solve_table(yik)
@@ -0,0 +1,140 @@
+from scheduler_highs import SchedulerHighs
+from scheduler_cpsat import SchedulerCPSAT
+from scheduler_colgen import SchedulerColumnGeneration
+from scheduler_scipy import SchedulerScipy
+from scheduler_utils import exact_packing
+import random
+
+SLICE_SIZE = 300
+HORIZON = 15000
+EMPTY_INSTANCE_SCHEDULERS = [(SchedulerHighs, "highs"), (SchedulerColumnGeneration, "colgen"),
+                             (SchedulerScipy, "scipy")]
+
+
+def synthetic_input(n_requests, seed):
+    # Random requests with a few windows each on two telescopes, one of them with a gap
+    rng = random.Random(seed)
+    resources = {"t0": [{"start": 0, "end": HORIZON}],
+                 "t1": [{"start": 0, "end": 6000}, {"start": 8000, "end": HORIZON}]}
+    proposals = {"proposal_{}".format(p): {"tac_priority": rng.randint(5, 40)} for p in range(4)}
+    requests = {}
+    for i in range(n_requests):
+        duration = rng.randint(200, 2000)
+        windows = {}
+        for resource in resources:
+            windows[resource] = []
+            for _ in range(rng.randint(0, 2)):
+                start = rng.randint(0, HORIZON - duration)
+                windows[resource].append({"start": start, "end": min(start + duration + rng.choice((0, 300, 3000)), HORIZON)})
+        requests[str(i)] = {"windows": windows, "duration": duration,
+                            "proposal": rng.choice(list(proposals)), "resID": i}
+    return resources, proposals, requests
+
+
+def prepared_scheduler(n_requests, seed):
+    resources, proposals, requests = synthetic_input(n_requests, seed)
+    scheduler = SchedulerHighs(0, HORIZON, SLICE_SIZE, resources, proposals, requests,
+                               verbose=0, scheduler_type="highs")
+    scheduler.calculate_free_windows()
+    scheduler.build_data_structures()
+    return scheduler
+
+
+def maximal_cliques(index):
+    # Brute force: the distinct sets of starts sharing a slice, less any contained in another
+    sets = {frozenset(starts) for starts in index if len(starts) > 1}
+    return {s for s in sets if not any(s < t for t in sets)}
+
+
+def test_reduced_slice_rows_are_the_maximal_cliques():
+    for seed in range(20):
+        scheduler = prepared_scheduler(60, seed)
+        full = maximal_cliques(scheduler.aikt)
+        scheduler.reduce_slice_constraints()
+        kept = [frozenset(starts) for starts in scheduler.aikt]
+        assert set(kept) == full, "seed {}".format(seed)
+        assert len(kept) == len(full), "seed {}".format(seed)
+
+
+def test_clique_of_starts_beginning_and_ending_on_different_slices():
+    # Starts covering slices 0-5 and 2-7: no slice both begins and ends a start,
+    # but the two still overlap on slices 2-5
+    resources = {"t0": [{"start": 0, "end": HORIZON}]}
+    proposals = {"proposal_0": {"tac_priority": 10}}
+    requests = {"0": {"windows": {"t0": [{"start": 0, "end": 1800}]}, "duration": 1800,
+                      "proposal": "proposal_0", "resID": 0},
+                "1": {"windows": {"t0": [{"start": 600, "end": 2400}]}, "duration": 1800,
+                      "proposal": "proposal_0", "resID": 1}}
+    scheduler = SchedulerHighs(0, HORIZON, SLICE_SIZE, resources, proposals, requests,
+                               verbose=0, scheduler_type="highs")
+    result = scheduler.run()
+    assert len(result["scheduled"]) == 1
+
+
+def test_presolved_solve_matches_exact_packing():
+    for seed in range(5):
+        scheduler = prepared_scheduler(6, seed)
+        best_rows = exact_packing(scheduler.yik)
+        best = float(scheduler.yik.objective()[best_rows].sum())
+
+        scheduler.presolve()
+        scheduler.time_build_model()
+        scheduler.time_solve_model()
+        scheduler.time_interpret_model()
+        assert abs(scheduler.objective_value - best) < 1e-6, "seed {}".format(seed)
+
+
+def test_interval_model_matches_exact_packing():
+    for seed in range(5):
+        resources, proposals, requests = synthetic_input(6, seed)
+        scheduler = SchedulerCPSAT(0, HORIZON, SLICE_SIZE, resources, proposals, requests,
+                                   verbose=0, scheduler_type="cpsat_interval")
+        scheduler.calculate_free_windows()
+        scheduler.build_data_structures()
+        best = float(scheduler.yik.objective()[exact_packing(scheduler.yik)].sum())
+
+        scheduler.run()
+        assert scheduler.has_schedule(), "seed {}".format(seed)
+        assert abs(scheduler.objective_value - best) < 1e-2, "seed {}".format(seed)
+
+
+def test_requests_without_windows_count_as_unschedulable():
+    resources, proposals, requests = synthetic_input(60, 5)
+    no_windows = sum(1 for r in requests.values() if not any(r["windows"].values()))
+    scheduler = SchedulerHighs(0, HORIZON, SLICE_SIZE, resources, proposals, requests,
+                               verbose=0, scheduler_type="highs")
+    scheduler.calculate_free_windows()
+    scheduler.build_data_structures()
+    scheduler.presolve()
+    assert no_windows > 0
+    assert scheduler.presolve_stats["requests_outside_horizon"] == 0
+    assert scheduler.presolve_stats["requests_unschedulable"] == no_windows
+
+
+def test_coarse_to_fine_drops_starts_and_keeps_a_feasible_schedule():
+    for seed in range(5):
+        resources, proposals, requests = synthetic_input(60, seed)
+        scheduler = SchedulerHighs(0, HORIZON, SLICE_SIZE, resources, proposals, requests,
+                                   verbose=0, scheduler_type="highs")
+        result = scheduler.run_coarse_to_fine()
+        assert scheduler.presolve_stats["refined_starts_dropped"] > 0, "seed {}".format(seed)
+        busy = {}
+        for s in result["scheduled"].values():
+            busy.setdefault(s["resource"], []).append((s["start"], s["end"]))
+        for intervals in busy.values():
+            intervals.sort()
+            assert all(a[1] <= b[0] for a, b in zip(intervals, intervals[1:])), "seed {}".format(seed)
+
+
+def test_instance_without_possible_starts_gives_an_empty_optimal_schedule():
+    # The only request is longer than its window
+    resources = {"t0": [{"start": 0, "end": HORIZON}]}
+    proposals = {"proposal_0": {"tac_priority": 10}}
+    requests = {"0": {"windows": {"t0": [{"start": 0, "end": 100}]}, "duration": 1800,
+                      "proposal": "proposal_0", "resID": 0}}
+    for Scheduler, scheduler_type in EMPTY_INSTANCE_SCHEDULERS:
+        scheduler = Scheduler(0, HORIZON, SLICE_SIZE, resources, proposals, requests,
+                              verbose=0, scheduler_type=scheduler_type)
+        result = scheduler.run()
+        assert scheduler.scheduler_status == 1, scheduler_type
+        assert len(result["scheduled"]) == 0, scheduler_type
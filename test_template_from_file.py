@@ -14,11 +14,13 @@ import pandas as pd
 
 
 class AltPerformanceTest(object):
-    def __init__(self, input_folder, output_folder, file_identifier, scheduler_type="gurobi", timelimit=0):
+    def __init__(self, input_folder, output_folder, file_identifier, scheduler_type="gurobi", timelimit=0,
+                 cache=None):
         self.input_folder = input_folder
         self.output_dir = os.path.join(output_folder, file_identifier)
         os.makedirs(self.output_dir, exist_ok=True)
         self.timelimit = timelimit
+        self.cache = cache # A SolveCache shared by every run of the test
 
         self.scheduler_type = scheduler_type
 
@@ -68,16 +70,19 @@ class AltPerformanceTest(object):
                     proposals=scheduler_data["proposals"],
                     requests=scheduler_data["requests"],
                     timelimit=self.timelimit,
-                    scheduler_type=self.scheduler_type
+                    scheduler_type=self.scheduler_type,
+                    cache=self.cache
         )
 
         scheduler.run()
 
         output = {
+            "objective": scheduler.objective_value,
             "build": scheduler.build_time,
             "solve": scheduler.solve_time,
             "interpret": scheduler.interpret_time,
             "total_time": scheduler.get_total_time(),
+            "cache_hit": scheduler.cache_hit, # Times are zero for a cached result
             "scheduler_type": self.scheduler_type,
             "input_file": input_file,
             "input_folder": self.input_folder
@@ -191,8 +196,8 @@ class SchedulerPerformanceTest(object):
 
 class SolverComparisonTest(AltPerformanceTest):
     def __init__(self, input_folder, output_folder, 
-                 file_identifier, scheduler_type, timelimit=0):
-        super().__init__(input_folder, output_folder, file_identifier, scheduler_type, timelimit)
+                 file_identifier, scheduler_type, timelimit=0, cache=None):
+        super().__init__(input_folder, output_folder, file_identifier, scheduler_type, timelimit, cache)
 
 
     def generate_output_filename(self, input_filename):
@@ -217,6 +222,64 @@ class SolverComparisonTest(AltPerformanceTest):
             f.write("{}".format(output_data))
 
 
+class RollingHorizonComparisonTest(SolverComparisonTest):
+    def __init__(self, input_folder, output_folder, file_identifier, scheduler_type,
+                 block_length, overlap, timelimit=0):
+        self.block_length = block_length
+        self.overlap = overlap
+        super().__init__(input_folder, output_folder, file_identifier, scheduler_type, timelimit)
+
+
+    def generate_output_filename(self, input_filename):
+        filename_split = input_filename.split(".")
+        filename_split[0] += "_{}_rolling_{}_{}".format(self.scheduler_type, self.block_length, self.overlap)
+        return ".".join(filename_split)
+
+
+    def test_loop(self, input_file):
+        # Solve the first scheduling run both as one model and with a rolling horizon
+        input_filepath = os.path.join(self.input_folder, input_file)
+        input_data = json.load(open(input_filepath, "r"))
+        sim = SchedulerSimulation(data=input_data, scheduler_type=self.scheduler_type, timelimit=self.timelimit)
+
+        next_events = sim.get_next_events()
+        sim.process_event_group(next_events)
+
+        output = {
+            "scheduler_type": self.scheduler_type,
+            "block_length": self.block_length,
+            "overlap": self.overlap,
+            "input_file": input_file,
+            "input_folder": self.input_folder
+        }
+        for mode in ("monolithic", "rolling"):
+            scheduler_data = sim.get_scheduler_info()
+            scheduler = sim.Scheduler(now=scheduler_data["now"],
+                        horizon=scheduler_data["horizon"],
+                        slice_size=scheduler_data["slice_size"],
+                        resources=deepcopy(scheduler_data["resources"]),
+                        proposals=scheduler_data["proposals"],
+                        requests=deepcopy(scheduler_data["requests"]),
+                        timelimit=self.timelimit,
+                        scheduler_type=self.scheduler_type
+            )
+            if mode == "monolithic":
+                scheduler.run()
+            else:
+                scheduler.run_rolling_horizon(self.block_length, self.overlap)
+
+            output[mode] = {
+                "objective": scheduler.objective_value,
+                "build": scheduler.build_time,
+                "solve": scheduler.solve_time,
+                "total_time": scheduler.get_total_time()
+            }
+
+        if output["monolithic"]["objective"] and output["rolling"]["objective"] is not None:
+            output["objective_ratio"] = output["rolling"]["objective"] / output["monolithic"]["objective"]
+        return json.dumps(output)
+
+
 class AltPerformanceTestParser(object):
     def __init__(self, output_folder, file_identifier):
         self.output_dir = os.path.join(output_folder, file_identifier)
@@ -260,8 +323,10 @@ class AltPerformanceTestParser(object):
 
 class AltVariableWindowsTest(AltPerformanceTest):
     def __init__(self, input_folder, output_folder, file_identifier,
-                 window_increase_factor, test_fraction):
-        super().__init__(input_folder, output_folder, file_identifier)
+                 window_increase_factor, test_fraction, scheduler_type="gurobi", timelimit=0,
+                 cache=None):
+        # Every simulation here repeats most of the same scheduler runs, so a cache pays off
+        super().__init__(input_folder, output_folder, file_identifier, scheduler_type, timelimit, cache)
         self.window_increase_factor = window_increase_factor
         self.test_fraction = test_fraction
         self.total_iterations = len(self.input_files)
@@ -290,7 +355,8 @@ class AltVariableWindowsTest(AltPerformanceTest):
 
 
     def variable_window_test(self, input_data, modified_requests):
-        sim = SchedulerSimulation(data=input_data)
+        sim = SchedulerSimulation(data=input_data, scheduler_type=self.scheduler_type,
+                                  timelimit=self.timelimit, cache=self.cache)
         # print("Running Simulation...")
         sim.run_simulation()
         current_results = set(sim.completed_requests.keys())
@@ -311,7 +377,8 @@ class AltVariableWindowsTest(AltPerformanceTest):
         input_data = json.load(open(input_filepath, "r"))
 
         # Load all the requests into a SchedulerSimulation instance
-        sim = SchedulerSimulation(data=input_data)
+        sim = SchedulerSimulation(data=input_data, scheduler_type=self.scheduler_type,
+                                  timelimit=self.timelimit, cache=self.cache)
 
         # Make a copy of all the requests present in the simulation,
         # to be able to reliably alter them.